@@ -0,0 +1,55 @@
+from tree_compressor import shown_values
+import hashlib
+import json
+import os
+
+class AnswerCache:
+    """ Verdicts the user gave, keyed by a digest of the function's qualified name, the hash of
+    its source and the values the user was shown. Kept in a JSON file between sessions, so that
+    after a fix only the calls of edited functions, or calls with other values, are asked again. """
+    version = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.answers = {}
+        self.digests = {}
+        self.auto_answered = 0
+        if os.path.isfile(path):
+            with open(path) as f:
+                stored = json.load(f)
+            if stored.get("version") == self.version:
+                self.answers = stored["answers"]
+
+    def source_digest(self, source):
+        # one source map per code object, hashed once
+        try:
+            return self.digests[id(source)]
+        except KeyError:
+            text = "".join(source[lineno] for lineno in sorted(source))
+            digest = self.digests[id(source)] = hashlib.sha256(text.encode()).hexdigest()
+            return digest
+
+    def key(self, node):
+        values = shown_values(node.tree, node.id)
+        if values is None:
+            return None
+        blob = json.dumps([node.qualname, self.source_digest(node.source), values])
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def lookup(self, node):
+        answer = self.answers.get(self.key(node))
+        if answer is not None:
+            self.auto_answered += 1
+        return answer
+
+    def record(self, node, answer):
+        key = self.key(node)
+        if key is not None and answer in ("Yes", "No"):
+            self.answers[key] = answer
+
+    def save(self):
+        # written next to the store and renamed, an interrupted save keeps the previous verdicts
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version" : self.version, "answers" : self.answers}, f)
+        os.replace(temp_path, self.path)
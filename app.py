@@ -14,17 +14,41 @@ if __name__ == '__main__':
                         choices = ["single-stepping", "top-down", "heaviest-first", "divide-and-query"],
                         help="debugging strategy")
     parser.add_argument("-pr", type = str, required = True, 
-                        choices = ["bus", "bfs", "iddfs"],
+                        choices = ["bus", "bfs", "iddfs", "bestfs"],
                         help="program repair strategy")
     parser.add_argument("-t", type = str, default = "trace.dat", help = "trace log")
     parser.add_argument("-c", type = str, default = "coverage.dat", help="static coverage file")
+    parser.add_argument("-b", type = str, default = "settrace", choices = ["settrace", "monitoring"],
+                        help="tracing backend")
+    parser.add_argument("-inc", type = str, default = "", help="comma-separated module/path globs to trace")
+    parser.add_argument("-exc", type = str, default = "", help="comma-separated module/path globs to skip")
+    parser.add_argument("-cd", type = int, default = 3, help="max depth of captured values")
+    parser.add_argument("-cl", type = int, default = 100, help="max length of captured containers")
+    parser.add_argument("-cs", type = int, default = 200, help="max length of captured strings/bytes")
+    parser.add_argument("-m", type = str, default = "full",
+                        help="trace mode: full, calls, light (re-execute calls on demand), sample:N (1 in N line events) "
+                             "or ring:K (first and last K per call)")
+    parser.add_argument("-z", type = str, default = "no", choices = ["no", "subtrees", "recursion", "all"],
+                        help="tree compression: ask once per class of identical calls, fold direct recursion or both")
+    parser.add_argument("-a", type = str, default = "no",
+                        help="file keeping the answers between sessions (e.g. answers.json), no to ask every question again")
+    parser.add_argument("-trust", type = str, default = "stdlib",
+                        help="comma-separated calls never asked about: stdlib, module or module.function globs, "
+                             "path globs or @decorator names; no to trust nothing. stdlib only applies to "
+                             "library code traced through -inc")
+    parser.add_argument("-j", type = int, default = 1, help="processes testing program repair candidates")
 
     args = parser.parse_args()
     if args.w == "yes":
         if args.i == "no":
             from server import WSHandler, run_server
             _pydd = "./pydd.py"
-            _args = f"-f {args.f} -i {args.i} -w {args.w} -d {args.d} -pr {args.pr} -t {args.t} -c {args.c}"
+            _args = f"-f {args.f} -i {args.i} -w {args.w} -d {args.d} -pr {args.pr} -t {args.t} -c {args.c} -b {args.b}"
+            _args += f" -cd {args.cd} -cl {args.cl} -cs {args.cs} -m {args.m} -z {args.z} -a {args.a} -trust {args.trust} -j {args.j}"
+            if args.inc:
+                _args += f" -inc {args.inc}"
+            if args.exc:
+                _args += f" -exc {args.exc}"
             setattr(WSHandler, "pydd", _pydd)
             setattr(WSHandler, "args", _args)
             try:
@@ -37,7 +61,8 @@ if __name__ == '__main__':
             exit(-1)
     else:
         from pydd import PyDD
-        with PyDD(args.f, args.i, args.w, args.d, args.pr, (args.t, args.c)) as debugger:
+        with PyDD(args.f, args.i, args.w, args.d, args.pr, (args.t, args.c), args.b, args.inc, args.exc,
+                  (args.cd, args.cl, args.cs), args.m, args.z, args.a, args.trust, args.j) as debugger:
             debugger.run()
             try:
                 debugger.start_debugging()
@@ -0,0 +1,775 @@
+#!/usr/bin/env python3
+from execution_tree import ExecutionTree
+from traversal import preorder, postorder, levels, breadth_first
+from etnode import ETNode
+from debugging_strategy import DebuggingStrategy
+from tracer import Tracer, MonitoringTracer
+from pydd import PyDD
+from line_sampler import LineSampler
+from trust_policy import TrustPolicy
+from trace_log import TraceWriter, CoverageWriter
+from event import Event, EventBuffer
+from program_repairer import ProgramRepairer
+from candidate_evaluator import CandidateEvaluator, Template, batched
+from ast_transformer import ASTTransformer
+from astor import to_source
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+import argparse
+import astunparse
+import builtins
+import copy
+import ast
+import contextlib
+import random
+import io
+import subprocess
+import resource
+import json
+import sys
+import inspect
+import tempfile
+import tracemalloc
+import time
+import os
+import gc
+
+
+def legacy_signature(co):
+    # the heap scan previously used by Tracer.get_object
+    for obj in gc.get_referrers(co):
+        if hasattr(obj, "__code__") and obj.__code__ is co:
+            return str(inspect.signature(obj))
+
+def make_functions(count):
+    namespace = {}
+    for i in range(count):
+        exec(f"def f{i}(a, b = {i}, *args, k = None, **kw):\n    return a\n", namespace)
+    return [namespace[f"f{i}"] for i in range(count)]
+
+def make_tracer(directory, trace_file = None, backend = Tracer, **kwargs):
+    if trace_file is None:
+        trace_file = TraceWriter(os.path.join(directory, "trace.dat"))
+    cov_file = CoverageWriter(os.path.join(directory, "coverage.dat"))
+    return backend(ExecutionTree(), trace_file, cov_file, **kwargs)
+
+def call_all(functions):
+    for f in functions:
+        f(0)
+
+def bench_signature(objects, calls):
+    heap = [[i] for i in range(objects)] # keep the objects alive while measuring
+    functions = make_functions(calls)
+
+    start = time.perf_counter()
+    for f in functions:
+        legacy_signature(f.__code__)
+    legacy = (time.perf_counter() - start) / calls
+
+    start = time.perf_counter()
+    call_all(functions)
+    untraced = (time.perf_counter() - start) / calls
+
+    # every function is called once, so each call resolves a new code object
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = make_tracer(directory)
+        start = time.perf_counter()
+        with tracer:
+            call_all(functions)
+        traced = (time.perf_counter() - start) / calls
+        tracer.trace_file.close()
+        tracer.cov_file.close()
+
+    print(f"live objects: {len(heap)}, calls: {calls}")
+    print(f"legacy signature lookup: {legacy * 1e6:.1f}us per code object")
+    print(f"traced call overhead: {(traced - untraced) * 1e6:.1f}us per first call "
+          f"({tracer.code_cache.misses} misses, {tracer.code_cache.hits} hits)")
+
+
+@dataclass
+class LegacyEvent:
+    # the per-event record used before events were made compact
+    timestamp: float
+    event: str
+    lineno: int
+    line: str
+    locals: dict
+
+def loop(n):
+    total = 0
+    for i in range(n):
+        if i % 3:
+            total += i
+        else:
+            total -= 1
+    return total
+
+def allocated(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, kept
+
+def bench_events(iterations):
+    buffer = EventBuffer()
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = make_tracer(directory, buffer)
+        with tracer:
+            loop(iterations)
+        tracer.cov_file.close()
+    node_id = max(buffer.nodes, key = lambda node_id : len(buffer.nodes[node_id][0]))
+    source = buffer.sources[node_id]
+    linenos, timestamps, f_locals = buffer.nodes[node_id]
+    # the locals deltas already exist, only the records around them are measured
+    records = [(lineno, f_locals[i] or {}) for i, lineno in enumerate(linenos)]
+    count = len(records)
+
+    legacy, _ = allocated(lambda : [LegacyEvent(datetime.timestamp(datetime.now()), "line", lineno, source[lineno], d)
+                                    for lineno, d in records])
+    slotted, _ = allocated(lambda : [Event(node_id, lineno, time.monotonic_ns(), d, source)
+                                     for lineno, d in records])
+    def fill():
+        compact = EventBuffer()
+        for lineno, d in records:
+            compact.append(node_id, Event(node_id, lineno, time.monotonic_ns(), d, source))
+        return compact
+    buffered, _ = allocated(fill)
+
+    print(f"line events: {count}")
+    print(f"legacy Event records: {legacy / count:.1f} bytes per event")
+    print(f"slotted Event records: {slotted / count:.1f} bytes per event ({legacy / slotted:.1f}x smaller)")
+    print(f"EventBuffer arrays: {buffered / count:.1f} bytes per event ({legacy / buffered:.1f}x smaller)")
+
+    # the live path: PyDD writes every event to the trace log and drops the Event object
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = make_tracer(directory)
+        with tracer:
+            loop(iterations)
+        trace_file = tracer.trace_file
+        logged = sum(map(len, trace_file.index.values()))
+        in_memory = sum(offsets.itemsize * len(offsets) for offsets in trace_file.index.values())
+        trace_file.close()
+        tracer.cov_file.close()
+        on_disk = os.path.getsize(trace_file.path)
+    print(f"trace log (live path): {in_memory / logged:.1f} bytes per event in memory, "
+          f"{on_disk / logged:.1f} bytes per event on disk")
+
+
+class LegacyNode:
+    # the per-node object used before the tree was array-backed
+    def __init__(self, id, name, sig = "", params = {}, source = {}, result = None):
+        self.id = id
+        self.state = ETNode.State.UNKNOWN
+        self.name = name
+        self.sig = sig
+        self.params = params
+        self.m_params = params.copy()
+        self.locals = {}
+        self.source = source
+        self.result = result
+        self.parent = None
+        self.left_child = None
+        self.right_sibling = None
+
+def legacy_insert_at(parent, node):
+    # sibling walk previously done by ExecutionTree.insert_at
+    ptr = parent.left_child
+    if ptr:
+        while ptr.right_sibling:
+            ptr = ptr.right_sibling
+        ptr.right_sibling = node
+    else:
+        parent.left_child = node
+    node.parent = parent
+
+def bench_tree(nodes, fanout):
+    # nodes are added as fanout children per parent, in the order a tracer would insert them
+    def build_legacy():
+        root = LegacyNode(0, "f")
+        parents = [root]
+        for i in range(1, nodes):
+            node = LegacyNode(i, "f", "(x)", {})
+            legacy_insert_at(parents[(i - 1) // fanout], node)
+            parents.append(node)
+        return parents
+
+    def build_arrays():
+        tree = ExecutionTree()
+        tree.insert(None, "f")
+        for i in range(1, nodes):
+            tree.insert(tree.node((i - 1) // fanout), "f", "(x)", {})
+        return tree
+
+    def timed(build):
+        start = time.perf_counter()
+        build()
+        return time.perf_counter() - start
+
+    legacy_time, arrays_time = timed(build_legacy), timed(build_arrays)
+    legacy, _ = allocated(build_legacy)
+    arrays, _ = allocated(build_arrays)
+    print(f"nodes: {nodes}, children per node: {fanout}")
+    print(f"legacy ETNode objects: {legacy / nodes:.1f} bytes per node, built in {legacy_time:.2f}s")
+    print(f"array-backed ExecutionTree: {arrays / nodes:.1f} bytes per node, built in {arrays_time:.2f}s")
+
+def random_tree(nodes, seed):
+    # random call tree built the way the tracer builds it: calls are inserted and closed in order
+    rng = random.Random(seed)
+    tree = ExecutionTree()
+    stack = [tree.insert(None, "main")]
+    for i in range(1, nodes):
+        while len(stack) > 1 and rng.random() < 0.55:
+            tree.close(stack.pop())
+        stack.append(tree.insert(stack[-1], f"f{rng.randrange(50)}", "(x)"))
+    while stack:
+        tree.close(stack.pop())
+    return tree
+
+class SimulatedOracle:
+    # answers No for the buggy node and its ancestors, timing the gap between questions
+    def __init__(self, tree, buggy_id):
+        self.tree = tree
+        self.buggy_id = buggy_id
+        self.asked = []
+        self.latencies = []
+        self.last = time.perf_counter()
+
+    def query(self, node):
+        now = time.perf_counter()
+        self.latencies.append(now - self.last)
+        self.asked.append(node.id)
+        answer = "No" if node.id <= self.buggy_id < self.tree.ends[node.id] else "Yes"
+        self.last = time.perf_counter()
+        return answer
+
+def legacy_divide_and_query(tree, oracle):
+    # selection previously used by divide_and_query: weights rebuilt per root, min() over all candidates
+    def get_weights(root):
+        order, stack = [], [root]
+        while stack:
+            ptr = stack.pop()
+            order.append(ptr)
+            stack.extend(reversed(ptr._get_children()))
+        weights = {ptr.id : [ptr, 1] for ptr in order}
+        for ptr in reversed(order[1:]):
+            weights[ptr.parent.id][1] += weights[ptr.id][1]
+        return weights
+
+    root = tree.root
+    weights = get_weights(root)
+    while weights:
+        best_weight = weights[root.id][1] // 2 if root.id in weights else root.weight // 2
+        node_id, (node, node_weight) = min(weights.items(), key = lambda e : abs(e[1][1] - best_weight))
+        del weights[node_id]
+        answer = oracle.query(node)
+        if answer == "Yes":
+            node.state = ETNode.State.VALID
+            if node.is_terminal() and node.parent.state == ETNode.State.INVALID:
+                return
+            node.parent.fix_tree(node)
+            ptr = node
+            while ptr != root:
+                weights[ptr.parent.id][1] -= node_weight
+                ptr = ptr.parent
+            stack = [node.left_child] if node.left_child else []
+            while stack:
+                ptr = stack.pop()
+                del weights[ptr.id]
+                if ptr.right_sibling:
+                    stack.append(ptr.right_sibling)
+                if ptr.left_child:
+                    stack.append(ptr.left_child)
+        else:
+            node.state = ETNode.State.INVALID
+            node.right_sibling = None
+            if node.is_leaf():
+                return
+            root = node
+            tree.root = node
+            weights = get_weights(node)
+
+def bench_questions(nodes, seed):
+    buggy_id = random.Random(seed).randrange(1, nodes)
+    legacy = SimulatedOracle(random_tree(nodes, seed), buggy_id)
+    legacy_divide_and_query(legacy.tree, legacy)
+    indexed = SimulatedOracle(random_tree(nodes, seed), buggy_id)
+    with contextlib.redirect_stdout(io.StringIO()):
+        DebuggingStrategy(indexed.tree, False, None, indexed, lambda *args : []).divide_and_query()
+    print(f"nodes: {nodes}, buggy node: {buggy_id}, questions: {len(indexed.asked)}, "
+          f"same questions: {legacy.asked == indexed.asked}")
+    for name, oracle in (("legacy min() selection", legacy), ("weight index", indexed)):
+        latencies = oracle.latencies
+        print(f"{name}: {sum(latencies) / len(latencies) * 1e3:.2f}ms per question, "
+              f"{max(latencies) * 1e3:.2f}ms worst (first includes building the candidates)")
+
+def chain_tree(depth):
+    # one call nested in the other, depth levels down
+    tree = ExecutionTree()
+    stack = [tree.insert(None, "main")]
+    for i in range(1, depth):
+        stack.append(tree.insert(stack[-1], "f", "(n)"))
+    while stack:
+        tree.close(stack.pop())
+    return tree
+
+def star_tree(fanout):
+    # fanout sequential calls made by main
+    tree = ExecutionTree()
+    root = tree.insert(None, "main")
+    for i in range(1, fanout):
+        tree.close(tree.insert(root, "f", "(n)"))
+    tree.close(root)
+    return tree
+
+# the recursive walks the traversal module replaced, the references for the iterative ones
+
+def recursive_preorder(node, prune, out):
+    out.append(node.id)
+    if prune is None or not prune(node):
+        for child in node._get_children():
+            recursive_preorder(child, prune, out)
+    return out
+
+def recursive_postorder(node, prune, out):
+    if prune is None or not prune(node):
+        for child in node._get_children():
+            recursive_postorder(child, prune, out)
+    out.append(node.id)
+    return out
+
+def recursive_levels(node, prune, out, depth = 0):
+    if depth == len(out):
+        out.append([])
+    out[depth].append(node.id)
+    if prune is None or not prune(node):
+        for child in node._get_children():
+            recursive_levels(child, prune, out, depth + 1)
+    return out
+
+def recursive_height(node):
+    return 1 + max((recursive_height(child) for child in node._get_children()), default = 0)
+
+def recursive_to_ascii(node, curr_id, prefix = "", ls = None):
+    ls = [] if ls is None else ls
+    connector = "└── " if node.is_terminal() else "├── "
+    st = f"{prefix}{connector}"
+    if node.state == ETNode.State.INVALID:
+        st += f"[red]{str(node)}[/red]"
+    else:
+        st += f"[yellow]{str(node)}[/yellow]"
+    if node.id == curr_id:
+        st += f"\t[gray]<-[/gray]"
+    ls.append(st + "\n")
+    for child in node._get_children():
+        recursive_to_ascii(child, curr_id, prefix + ("    " if node.is_terminal() else "│   "), ls)
+    return ls
+
+def recursive_to_json(node, nodes, edges):
+    # ids and edges only, the labels are the same calls on the same views
+    nodes.append(node.id)
+    if node.left_child:
+        edges.setdefault(node.id, []).append((node.id, node.left_child.id))
+        recursive_to_json(node.left_child, nodes, edges)
+    if node.right_sibling:
+        if node.parent:
+            edges.setdefault(node.parent.id, []).append((node.parent.id, node.right_sibling.id))
+        recursive_to_json(node.right_sibling, nodes, edges)
+    return nodes, [edge for ls in edges.values() for edge in ls]
+
+def check_walk_orders(trees):
+    """ Returns the names of the walks whose order differs from the recursive reference """
+    prune = lambda node : node.id % 3 == 0
+    failed = set()
+    for tree in trees:
+        root = tree.root
+        for p in (None, prune):
+            if [node.id for node in preorder(root, p)] != recursive_preorder(root, p, []):
+                failed.add("preorder")
+            if [node.id for node in postorder(root, p)] != recursive_postorder(root, p, []):
+                failed.add("postorder")
+            reference = recursive_levels(root, p, [])
+            if [[node.id for node in level] for level in levels(root, p)] != reference:
+                failed.add("levels")
+            if [node.id for node in breadth_first(root, p)] != [node_id for level in reference for node_id in level]:
+                failed.add("breadth_first")
+        if tree.height(root) != recursive_height(root):
+            failed.add("height")
+        curr_id = tree.size // 2
+        if ExecutionTree.to_ascii(root, curr_id) != recursive_to_ascii(root, curr_id):
+            failed.add("to_ascii")
+        message = json.loads(ExecutionTree.to_json(root, curr_id)[0])["tree"]
+        walked = ([node["id"] for node in message["nodes"]], [(edge["from"], edge["to"]) for edge in message["edges"]])
+        if walked != recursive_to_json(root, [], {}):
+            failed.add("to_json")
+    return sorted(failed)
+
+def bench_walks(nodes):
+    # orders first, on trees the recursive references can walk: random shapes, a chain, a wide
+    # call and a second top-level call after the root
+    forest = random_tree(200, 1)
+    second = forest.insert(None, "g")
+    forest.close(forest.insert(second, "h", "(x)"))
+    forest.close(second)
+    trees = [random_tree(300, seed) for seed in range(20)] + [chain_tree(300), star_tree(300), forest]
+    failed = check_walk_orders(trees)
+    print(f"orders on {len(trees)} trees: {'same as the recursive walks' if not failed else 'differ in ' + ', '.join(failed)}")
+    # every walk must finish on trees far deeper and wider than the recursion limit
+    ascii_depth = 5000 # the ASCII tree grows with the square of the depth
+    for shape, build, buggy_id in (("depth", chain_tree, nodes - 1), ("fan-out", star_tree, nodes // 2)):
+        tree = build(nodes)
+        print(f"{shape} {nodes} (recursion limit {sys.getrecursionlimit()})")
+        ascii_root = tree.node(max(0, nodes - ascii_depth)) if shape == "depth" else tree.root
+        walks = [
+            ("height", lambda : tree.height(tree.root) == (nodes if shape == "depth" else 2)),
+            ("to_json", lambda : len(json.loads(ExecutionTree.to_json(tree.root, buggy_id)[0])["tree"]["nodes"]) == nodes),
+            ("to_ascii", lambda : len(ExecutionTree.to_ascii(ascii_root, buggy_id)) == ascii_root.weight),
+        ]
+        strategies = ["single_stepping", "top_down", "divide_and_query"]
+        if shape == "depth":
+            # heaviest_first takes the max() over all siblings for every question
+            strategies.append("heaviest_first")
+        for name in strategies:
+            def run(name = name):
+                oracle = SimulatedOracle(build(nodes), buggy_id)
+                out = io.StringIO()
+                with contextlib.redirect_stdout(out):
+                    getattr(DebuggingStrategy(oracle.tree, False, None, oracle, lambda *args : []), name)()
+                return f"found at ({buggy_id})" in out.getvalue()
+            walks.append((name, run))
+        for name, walk in walks:
+            start = time.perf_counter()
+            try:
+                correct = walk()
+            except RecursionError:
+                correct = False
+            if not correct:
+                failed.append(f"{shape} {name}")
+            print(f"  {name}: {time.perf_counter() - start:.2f}s{'' if correct else ' FAILED'}")
+    if failed:
+        sys.exit(1)
+
+def handled():
+    try:
+        int("a")
+    except ValueError:
+        pass
+    return None
+
+def reraised():
+    try:
+        int("b")
+    finally:
+        pass
+
+def raised():
+    int("c")
+
+def rebinds(xs, n):
+    xs.append(n)
+    n = n + 1
+    xs.append(n)
+    n = n * 2
+    return n
+
+def adder(n):
+    def add(x, k = n):
+        return x + k
+    return add(0)
+
+class Link:
+    def __init__(self, prev = None):
+        self.prev = prev
+        self.next = None
+
+def link(head, length):
+    # a doubly linked list, every node refers back to the one before it
+    node = head
+    for i in range(length):
+        node.next = Link(node)
+        node = node.next
+    return length
+
+def exceptions():
+    rebinds([], 1)
+    link(Link(), 10)
+    adder(1)
+    adder(2)
+    handled()
+    for f in (reraised, raised):
+        try:
+            f()
+        except ValueError:
+            pass
+
+def check_results():
+    # a call that handles an exception returns None, one that lets it through reports it,
+    # whether or not the frame gets line events. Modified parameters are kept up to date
+    # on the lines a bounded trace drops. Functions sharing a code object keep their own defaults.
+    # Object graphs are captured up to the depth limit, with references back up marked.
+    expected = {"handled" : None,
+                "reraised" : "ValueError : invalid literal for int() with base 10: 'b'",
+                "raised" : "ValueError : invalid literal for int() with base 10: 'c'"}
+    backends = [("settrace", Tracer)]
+    if sys.version_info >= (3, 12):
+        backends.append(("monitoring", MonitoringTracer))
+    failed = 0
+    for backend_name, backend in backends:
+        for mode in ("full", "calls", "light", "sample:2", "sample:3", "ring:1", "trusted"):
+            with tempfile.TemporaryDirectory() as directory:
+                if mode == "trusted":
+                    trust = TrustPolicy(["*.handled", "*.reraised", "*.raised"])
+                    tracer = make_tracer(directory, backend = backend, trust = trust)
+                else:
+                    tracer = make_tracer(directory, backend = backend, sampler = LineSampler.parse(mode))
+                with tracer:
+                    exceptions()
+                tracer.trace_file.close()
+                tracer.cov_file.close()
+            tree = tracer.exec_tree
+            nodes = {tree.node(i).name : tree.node(i) for i in range(tree.size)}
+            wrong = {name : nodes[name].result for name, result in expected.items() if nodes[name].result != result}
+            if mode not in ("calls", "light", "trusted") and nodes["rebinds"].m_params != {"xs" : [1, 2], "n" : 4}:
+                wrong["rebinds"] = nodes["rebinds"].m_params
+            if mode not in ("calls", "light", "trusted"):
+                head = nodes["link"].m_params["head"]
+                if "back-reference" not in repr(head) or "max depth" not in repr(head):
+                    wrong["link"] = head
+            sigs = [tree.node(i).sig for i in range(tree.size) if tree.node(i).name == "add"]
+            if sigs != ["(x, k=1)", "(x, k=2)"]:
+                wrong["add"] = sigs
+            failed += bool(wrong)
+            print(f"{backend_name} {mode}: {'ok' if not wrong else wrong}")
+    if failed:
+        sys.exit(1)
+
+SYNTHESIS_SOURCE = """def count(xs, n):
+    total = 0
+    for x in xs:
+        if x < n:
+            total = total + abs(x)
+    return total
+"""
+
+def bench_synthesis(candidates, length = 5000):
+    # the first candidates bfs enumerates for the condition on line 4 with the fix moved last, the
+    # first match is the fix or an expression equivalent to it on the sem-specs
+    repairer = ProgramRepairer("count", SYNTHESIS_SOURCE, 4, "", [])
+    repairer.make_grammar()
+    fix = "x > n"
+    with contextlib.redirect_stdout(io.StringIO()):
+        enumerated = [p for p in dict.fromkeys(islice(repairer.grammar.bfs_candidates(), candidates * 4))
+                      if p not in (fix, "n < x")][:candidates - 1] + [fix]
+    namespace = {}
+    exec(SYNTHESIS_SOURCE.replace("x < n", fix), namespace)
+    inputs = [{"xs" : list(range(-length, length, step)), "n" : n} for step, n in ((1, 0), (3, 7), (7, -5))]
+    sem_specs = [(spec, namespace["count"](**copy.deepcopy(spec))) for spec in inputs]
+    args = ("count", repairer.tree, repairer.faulty_node[0], "", sem_specs)
+    print(f"{len(enumerated)} candidates, {2 * length} list items, {os.cpu_count()} cores")
+    serial = None
+    for jobs in range(1, max(2, os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        with CandidateEvaluator(*args, jobs = jobs) as evaluator:
+            match = evaluator.first_match(batched(enumerated, jobs * evaluator.chunk_size), lambda p, tests : None)
+        elapsed = time.perf_counter() - start
+        serial = serial or elapsed
+        print(f"  jobs {jobs}: {elapsed:.2f}s, {evaluator.evaluated} tested, {evaluator.evaluated / elapsed:.0f} candidates/s, "
+              f"speedup {serial / elapsed:.2f}x, match {match!r}")
+
+def legacy_run_candidate(f_name, tree, faulty_node, ret_val, sem_specs, p):
+    # the function re-parsed, unparsed and compiled for every candidate, as Grammar.is_match did
+    tree = copy.deepcopy(tree)
+    to_source(tree)
+    mutated_tree = ast.fix_missing_locations(ASTTransformer(p, faulty_node).visit(tree))
+    code = compile(astunparse.unparse(mutated_tree.body[0]), filename = "<string>", mode = "exec")
+    tests = []
+    for inputs, outputs in sem_specs:
+        _locals = copy.deepcopy(inputs)
+        namespace = {"__builtins__" : builtins}
+        try:
+            exec(code, namespace)
+            match = outputs == namespace[f_name](**_locals)
+        except Exception:
+            match = False
+        tests.append((inputs, match))
+    return tests
+
+def bench_evaluation(candidates):
+    # short sem-specs, so that the time goes into getting each candidate ready to run
+    inputs = [{"xs" : [1, 5, -2], "n" : 2}, {"xs" : [3, -4, 0, 8], "n" : -5}, {"xs" : [], "n" : 1}]
+    sem_specs = [(spec, sum(abs(x) for x in spec["xs"] if x > spec["n"])) for spec in inputs]
+    # the condition on line 4 gets the hole, the assignment on line 5 is run unchanged
+    for lineno in (4, 5):
+        print(f"fault on line {lineno}: {SYNTHESIS_SOURCE.splitlines()[lineno - 1].strip()}")
+        bench_template(lineno, sem_specs, candidates)
+
+def bench_template(lineno, sem_specs, candidates):
+    repairer = ProgramRepairer("count", SYNTHESIS_SOURCE, lineno, "", [])
+    repairer.make_grammar()
+    grammar = repairer.grammar
+    args = ("count", repairer.tree, repairer.faulty_node[0], "", sem_specs)
+    grammar.sem_specs = sem_specs
+    for strategy in ("bus", "bfs", "iddfs"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            stream = getattr(grammar, f"{strategy}_candidates")()
+            if strategy == "bus":
+                stream = (p for batch in stream for p in batch)
+            enumerated = list(dict.fromkeys(islice(stream, candidates)))
+        start = time.perf_counter()
+        legacy = [legacy_run_candidate(*args, p) for p in enumerated]
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        template = Template(*args)
+        results = [template.run(p) for p in enumerated]
+        template_time = time.perf_counter() - start
+        print(f"  {strategy}: {len(enumerated)} candidates, legacy {len(enumerated) / legacy_time:.0f}/s, "
+              f"template {len(enumerated) / template_time:.0f}/s ({legacy_time / template_time:.1f}x), "
+              f"same results: {legacy == results}")
+
+class SearchCapped(Exception):
+    pass
+
+def bench_search(expansions):
+    # count() with its condition on line 4 reversed and longer() with its condition on line 2 reversed
+    longer = """def longer(xs, ys):
+    if len(xs) < len(ys):
+        return xs
+    return ys
+"""
+    cases = [
+        ("count", SYNTHESIS_SOURCE, 4, [({"xs" : [1, 5, -2], "n" : 2}, 5), ({"xs" : [3, -4, 0, 8], "n" : -5}, 15)]),
+        ("longer", longer, 2, [({"xs" : [9], "ys" : [1, 2]}, [1, 2]), ({"xs" : [1, 1, 1], "ys" : [5]}, [1, 1, 1]),
+                               ({"xs" : [2, 3], "ys" : [7]}, [2, 3]), ({"xs" : [3], "ys" : [5, 5]}, [5, 5])]),
+    ]
+    for name, source, lineno, sem_specs in cases:
+        for strategy in ("bfs", "bestfs"):
+            repairer = ProgramRepairer(name, source, lineno, "", sem_specs)
+            repairer.make_grammar()
+            grammar = repairer.grammar
+            template = Template(name, repairer.tree, repairer.faulty_node[0], "", sem_specs)
+            children = grammar.children
+            def capped(p):
+                # bfs can expand for a long time without yielding a candidate
+                if grammar.expansions > expansions:
+                    raise SearchCapped
+                return children(p)
+            grammar.children = capped
+            start = time.perf_counter()
+            match, tested, seen = None, 0, set()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for p in getattr(grammar, f"{strategy}_candidates")():
+                        if p in seen:
+                            continue
+                        seen.add(p)
+                        tested += 1
+                        if all(passed for _, passed in template.run(p)):
+                            match = p
+                            break
+            except SearchCapped:
+                pass
+            print(f"{name} {strategy}: {grammar.expansions} expansions, {tested} tested, "
+                  f"{time.perf_counter() - start:.2f}s, match {match!r}")
+
+workloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+workloads = ["recursion", "loops", "calls", "data", "exceptions"]
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # kB on Linux
+
+def measure(path, traced, backend):
+    # runs in its own process so that peak RSS belongs to a single run
+    if not traced:
+        with open(path, "rb") as f:
+            code = compile(f.read(), path, "exec")
+        start = time.perf_counter()
+        exec(code, {"__file__" : path, "__name__" : "__main__", "__builtins__" : __builtins__})
+        return {"wall_time" : time.perf_counter() - start, "peak_rss" : peak_rss()}
+    with tempfile.TemporaryDirectory() as directory:
+        trace_file = os.path.join(directory, "trace.dat")
+        cov_file = os.path.join(directory, "coverage.dat")
+        with PyDD(path, "no", "no", "top-down", "bus", (trace_file, cov_file), backend) as debugger:
+            start = time.perf_counter()
+            debugger.run()
+            wall_time = time.perf_counter() - start
+            events = sum(map(len, debugger.trace_file.index.values()))
+            return {
+                "wall_time" : wall_time,
+                "peak_rss" : peak_rss(),
+                "events" : events,
+                "events_per_sec" : events / wall_time,
+                "nodes" : debugger.exec_tree.size,
+                "trace_size" : os.path.getsize(trace_file),
+                "coverage_size" : os.path.getsize(cov_file),
+                "failed" : bool(debugger.traceback),
+            }
+
+def run_measure(path, traced, backend):
+    cmd = [sys.executable, os.path.abspath(__file__), "measure", "-p", path, "-b", backend]
+    if traced:
+        cmd.append("--traced")
+    out = subprocess.run(cmd, check = True, capture_output = True, text = True).stdout
+    return json.loads(out.splitlines()[-1])
+
+def bench_suite(names, backend, output):
+    results = {"python" : sys.version.split()[0], "backend" : backend, "workloads" : {}}
+    for name in names:
+        path = os.path.join(workloads_dir, f"{name}.py")
+        untraced = run_measure(path, False, backend)
+        traced = run_measure(path, True, backend)
+        traced["untraced_wall_time"] = untraced["wall_time"]
+        traced["untraced_peak_rss"] = untraced["peak_rss"]
+        traced["slowdown"] = traced["wall_time"] / max(untraced["wall_time"], 1e-9)
+        results["workloads"][name] = traced
+        print(f"{name:<12} untraced {untraced['wall_time']:.3f}s  traced {traced['wall_time']:.3f}s "
+              f"({traced['slowdown']:.0f}x)  {traced['events_per_sec']:.0f} events/s  "
+              f"rss {traced['peak_rss'] / 2 ** 20:.0f}MB  nodes {traced['nodes']}  "
+              f"trace {(traced['trace_size'] + traced['coverage_size']) / 2 ** 10:.0f}kB", file = sys.stderr)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent = 2)
+    else:
+        print(json.dumps(results, indent = 2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage='%(prog)s [options]')
+    parser.add_argument("benchmark", type = str, choices = ["signature", "events", "results", "tree", "questions", "walks", "evaluation", "search", "synthesis", "suite", "measure"], help="benchmark to run")
+    parser.add_argument("-n", type = int, default = 10 ** 6, help="live objects held by the program")
+    parser.add_argument("-k", type = int, default = 200, help="distinct functions called")
+    parser.add_argument("-l", type = int, default = 10 ** 5, help="loop iterations traced by the events benchmark")
+    parser.add_argument("-t", type = int, default = 10 ** 5, help="nodes built by the tree benchmark")
+    parser.add_argument("-f", type = int, default = 1000, help="children per node in the tree benchmark")
+    parser.add_argument("-r", type = int, default = 400, help="repair candidates tested by the synthesis benchmark")
+    parser.add_argument("-e", type = int, default = 20000, help="partial programs the search benchmark expands at most")
+    parser.add_argument("-s", type = int, default = 0, help="seed of the random tree and buggy node")
+    parser.add_argument("-w", type = str, default = ",".join(workloads), help="comma-separated workloads run by the suite")
+    parser.add_argument("-b", type = str, default = "settrace", choices = ["settrace", "monitoring"], help="tracing backend")
+    parser.add_argument("-o", type = str, default = "", help="write the suite results as JSON to this file")
+    parser.add_argument("-p", type = str, help="workload measured by a single run")
+    parser.add_argument("--traced", action = "store_true", help="trace the measured workload")
+    args = parser.parse_args()
+    if args.benchmark == "signature":
+        bench_signature(args.n, args.k)
+    elif args.benchmark == "events":
+        bench_events(args.l)
+    elif args.benchmark == "results":
+        check_results()
+    elif args.benchmark == "tree":
+        bench_tree(args.t, args.f)
+    elif args.benchmark == "questions":
+        bench_questions(args.t, args.s)
+    elif args.benchmark == "walks":
+        bench_walks(args.t)
+    elif args.benchmark == "evaluation":
+        bench_evaluation(args.r)
+    elif args.benchmark == "search":
+        bench_search(args.e)
+    elif args.benchmark == "synthesis":
+        bench_synthesis(args.r)
+    elif args.benchmark == "suite":
+        bench_suite(args.w.split(","), args.b, args.o)
+    elif args.benchmark == "measure":
+        print(json.dumps(measure(args.p, args.traced, args.b)))
@@ -0,0 +1,18 @@
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def norm(self):
+        return abs(self.x) + abs(self.y)
+
+def add(a, b):
+    return a + b
+
+def scale(p, k):
+    return Point(p.x * k, p.y * k)
+
+total = 0
+for i in range(3000):
+    total = add(total, i)
+    total += scale(Point(i, -i), 2).norm()
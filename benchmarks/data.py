@@ -0,0 +1,22 @@
+def build(n):
+    xs = []
+    index = {}
+    for i in range(n):
+        xs.append(i)
+        index[i] = str(i)
+    return xs, index
+
+def update(xs, index, rounds):
+    for i in range(rounds):
+        xs[i] = -xs[i]
+        index.pop(i)
+    return len(index)
+
+def nested(n):
+    rows = [{"id" : i, "tags" : ["t" + str(j) for j in range(10)], "payload" : "x" * 500} for i in range(n)]
+    return len(rows)
+
+xs, index = build(5000)
+update(xs, index, 500)
+big = list(range(10 ** 6))
+nested(2000)
@@ -0,0 +1,34 @@
+class ValidationError(Exception):
+    pass
+
+def check(x):
+    if x % 2:
+        raise ValidationError(f"odd value {x}")
+    return x
+
+def validate(x):
+    try:
+        return check(x)
+    except ValidationError:
+        return -1
+
+def parse(s):
+    try:
+        return int(s)
+    except ValueError as e:
+        return validate(len(str(e)))
+    finally:
+        s = None
+
+def propagate(depth):
+    if depth == 0:
+        raise KeyError(depth)
+    return propagate(depth - 1)
+
+for i in range(2000):
+    validate(i)
+    parse(str(i) if i % 3 else "x")
+    try:
+        propagate(5)
+    except KeyError:
+        pass
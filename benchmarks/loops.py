@@ -0,0 +1,21 @@
+def matmul(a, b):
+    n = len(a)
+    c = [[0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            s = 0
+            for k in range(n):
+                s += a[i][k] * b[k][j]
+            c[i][j] = s
+    return c
+
+def count(n):
+    total = 0
+    for i in range(n):
+        if i % 3 == 0:
+            total += i
+    return total
+
+m = [[i + j for j in range(20)] for i in range(20)]
+matmul(m, m)
+count(20000)
@@ -0,0 +1,15 @@
+import sys
+
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+def depth(n):
+    if n == 0:
+        return 0
+    return 1 + depth(n - 1)
+
+sys.setrecursionlimit(10000)
+fib(15)
+depth(800)
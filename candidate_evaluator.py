@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from ast_transformer import ASTTransformer
+from itertools import islice
+from astor import to_source
+import builtins
+import copy
+import ast
+import astunparse
+
+# the name the template calls in place of the faulty expression
+HOLE = "__pydd_hole__"
+
+class Template:
+    """ The function under repair compiled once, with the faulty expression replaced by a hole.
+
+    A candidate is compiled on its own as an expression and the hole evaluates it in the
+    function's locals, so testing it needs neither a copy of the tree nor a new compile of
+    the function. Every candidate runs in a namespace of its own. Only comparisons are rewritten
+    (see ASTTransformer), any other faulty node leaves the function unchanged. """
+    def __init__(self, f_name, tree, faulty_node, ret_val, sem_specs):
+        self.f_name = f_name
+        self.ret_val = ret_val
+        self.sem_specs = sem_specs
+        self.hole = isinstance(faulty_node, ast.Compare)
+        template = copy.deepcopy(tree)
+        if self.hole:
+            # printing the whole tree sets the precedence the transformer's to_source of the fault relies on
+            to_source(template)
+            template = ASTTransformer(f"{HOLE}(locals())", faulty_node).visit(template)
+            template = ast.fix_missing_locations(template)
+            # what the function computed there, for candidates that do not parse
+            self.fault = compile(astunparse.unparse(faulty_node).strip(), filename = "<string>", mode = "eval")
+        self.code = compile(ast.Module(body = template.body[:1], type_ignores = []), filename = "<string>", mode = "exec")
+
+    def run(self, p):
+        """ Runs the function with p in the hole on every sem-spec, returns (inputs, passed) per sem-spec """
+        namespace = {"__builtins__" : builtins}
+        if self.hole:
+            try:
+                expr = compile(p, filename = "<string>", mode = "eval")
+            except SyntaxError:
+                expr = self.fault
+            namespace[HOLE] = lambda scope : eval(expr, namespace, scope)
+        tests = []
+        for inputs, outputs in self.sem_specs:
+            _locals = copy.deepcopy(inputs)
+            if isinstance(outputs, str):
+                outputs = _locals[outputs]
+            try:
+                exec(self.code, namespace)
+                temp = namespace[self.f_name](**_locals)
+                try:
+                    res = _locals[self.ret_val]
+                except KeyError:
+                    res = temp
+                match = outputs == res
+            except Exception:
+                match = False
+            tests.append((inputs, match))
+        return tests
+
+# set in each worker process by init_worker, the candidates are the only per-task data
+template = None
+
+def init_worker(state):
+    global template
+    template = Template(*state)
+
+def evaluate_chunk(candidates):
+    return [template.run(p) for p in candidates]
+
+def batched(candidates, size):
+    """ Groups a stream of candidates that are cheap to enumerate into batches of size """
+    candidates = iter(candidates)
+    while True:
+        batch = list(islice(candidates, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CandidateEvaluator:
+    """ Tests candidate expressions against the sem-specs, in this process or in a pool of
+    worker processes. The enumerator hands over one batch at a time, the batch is split into
+    chunks for the workers and their results are read back in enumeration order, so the first
+    match is the one a serial search would have found. The next batch is only enumerated once
+    the current one has failed. """
+    chunk_size = 16
+
+    def __init__(self, f_name, tree, faulty_node, ret_val, sem_specs, jobs = 1):
+        self.state = (f_name, tree, faulty_node, ret_val, sem_specs)
+        self.template = Template(*self.state)
+        self.jobs = jobs
+        self.evaluated = 0
+        self.pool = None
+
+    def __enter__(self):
+        if self.jobs > 1:
+            self.pool = ProcessPoolExecutor(max_workers = self.jobs, initializer = init_worker,
+                                            initargs = (self.state,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self.pool:
+            self.pool.shutdown(wait = True, cancel_futures = True)
+            self.pool = None
+        return False
+
+    def results(self, batch):
+        if not self.pool:
+            return (self.template.run(p) for p in batch)
+        # small enough chunks that every worker gets a share of a short batch
+        size = max(1, min(self.chunk_size, -(-len(batch) // self.jobs)))
+        futures = [self.pool.submit(evaluate_chunk, batch[i:i + size]) for i in range(0, len(batch), size)]
+        def ordered():
+            try:
+                for future in futures:
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+        return ordered()
+
+    def first_match(self, batches, on_result):
+        """ Returns the first candidate that passes every sem-spec, None if there is none.
+        on_result(p, tests) is called for each candidate up to that one, in order. """
+        for batch in batches:
+            results = self.results(batch)
+            for p, tests in zip(batch, results):
+                self.evaluated += 1
+                on_result(p, tests)
+                if all(match for _, match in tests):
+                    results.close()
+                    return p
+        return None
@@ -0,0 +1,120 @@
+from itertools import islice
+import reprlib
+
+class Truncated:
+    """ Bounded stand-in for a captured value that exceeded the capture policy """
+    __slots__ = ("type_name", "size", "preview", "detail")
+    truncated = True
+
+    def __init__(self, type_name, size, preview = None, detail = ""):
+        self.type_name = type_name
+        self.size = size
+        self.preview = preview
+        self.detail = detail
+
+    def __eq__(self, other):
+        return isinstance(other, Truncated) and \
+            (self.type_name, self.size, self.detail) == (other.type_name, other.size, other.detail) and \
+                self.preview == other.preview
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self.detail:
+            return f"<{self.type_name} {self.detail}>"
+        if self.preview is None:
+            return f"<{self.type_name} of size {self.size}>"
+        return f"{self.preview!r}... <{self.type_name} of size {self.size}, {len(self.preview)} shown>"
+
+
+def summarise_shape(value):
+    return f"shape={tuple(value.shape)} dtype={value.dtype}"
+
+def summarise_frame(value):
+    return f"shape={tuple(value.shape)} columns={reprlib.repr(list(value.columns))}"
+
+
+class CapturePolicy:
+    scalar_types = {int, float, complex, bool, type(None)}
+    text_types = {str, bytes}
+    container_types = (list, tuple, set, frozenset, dict)
+
+    def __init__(self, max_depth = 3, max_length = 100, max_string = 200):
+        self.max_depth = max_depth
+        self.max_length = max_length
+        self.max_string = max_string
+        self.truncations = 0
+        self.summarisers = {
+            "numpy.ndarray" : summarise_shape,
+            "pandas.core.series.Series" : summarise_shape,
+            "pandas.core.frame.DataFrame" : summarise_frame,
+        }
+
+    def register(self, type_name, summariser):
+        self.summarisers[type_name] = summariser
+
+    def type_name(self, value):
+        cls = type(value)
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    def get_summariser(self, value):
+        summariser = self.summarisers.get(self.type_name(value))
+        if not summariser and hasattr(value, "shape") and hasattr(value, "dtype") and \
+            getattr(value, "shape", ()) != ():
+            # array-likes that were not registered (e.g. tensors)
+            summariser = summarise_shape
+        return summariser
+
+    def capture(self, value, depth = 0):
+        """ Returns value itself when it is within the policy, a bounded copy or a Truncated otherwise """
+        value_type = type(value)
+        if value_type in self.scalar_types:
+            return value
+        if value_type in self.text_types:
+            if len(value) > self.max_string:
+                self.truncations += 1
+                return Truncated(value_type.__name__, len(value), value[:self.max_string])
+            return value
+        if isinstance(value, self.container_types):
+            return self.capture_container(value, depth)
+        summariser = self.get_summariser(value)
+        if summariser:
+            self.truncations += 1
+            try:
+                detail = summariser(value)
+            except Exception:
+                detail = "(unavailable)"
+            return Truncated(value_type.__name__, getattr(value, "size", None), detail = detail)
+        return value
+
+    def is_plain(self, values):
+        # scalars and short strings, kept as they are
+        types = set(map(type, values))
+        if types <= self.scalar_types:
+            return True
+        return types <= self.scalar_types | self.text_types and \
+            max(len(v) for v in values if type(v) in self.text_types) <= self.max_string
+
+    def capture_container(self, value, depth):
+        value_type = type(value)
+        if depth >= self.max_depth and value:
+            self.truncations += 1
+            return Truncated(value_type.__name__, len(value))
+        if len(value) > self.max_length:
+            self.truncations += 1
+            if isinstance(value, dict):
+                preview = {k : self.capture(v, depth + 1) for k, v in islice(value.items(), self.max_length)}
+            else:
+                preview = [self.capture(v, depth + 1) for v in islice(value, self.max_length)]
+            return Truncated(value_type.__name__, len(value), preview)
+        values = value.values() if isinstance(value, dict) else value
+        if self.is_plain(values):
+            return value
+        captured = [self.capture(v, depth + 1) for v in values]
+        if all(c is v for c, v in zip(captured, values)):
+            return value
+        if isinstance(value, dict):
+            return dict(zip(value.keys(), captured))
+        if value_type in self.container_types:
+            return value_type(captured)
+        return list(captured)
@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+import inspect
+
+@dataclass
+class CodeInfo:
+    qualname: str
+    source: dict
+    lineno: int
+    sig: str
+
+class CodeCache:
+    def __init__(self, resolve_sig):
+        self.resolve_sig = resolve_sig
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def lookup(self, frame):
+        co = frame.f_code
+        try:
+            info = self.entries[co]
+        except KeyError:
+            self.misses += 1
+            info = self.entries[co] = self.resolve(frame)
+        else:
+            self.hits += 1
+        return info
+    
+    def resolve(self, frame):
+        co = frame.f_code
+        try:
+            source_lines, starting_lineno = inspect.getsourcelines(frame)
+        except (OSError, TypeError):
+            source_lines, starting_lineno = [], co.co_firstlineno
+        # getsourcelines reports 0 for module frames
+        starting_lineno = max(starting_lineno, 1)
+        source = {starting_lineno + i: line for i, line in enumerate(source_lines)}
+        qualname = getattr(co, "co_qualname", co.co_name)
+        return CodeInfo(qualname, source, starting_lineno, self.resolve_sig(frame) or "")
@@ -4,40 +4,47 @@ from oracle import Terminal, Browser
 from query import Query
 from rich import print
 from etnode import ETNode
+from weight_index import WeightIndex
+from traversal import postorder, siblings
+from collections import deque
+from itertools import chain
 import json
  
 class DebuggingStrategy:
-    def __init__(self, exec_tree, interactive, pydd_repl, oracle, tree_formatter):
+    def __init__(self, exec_tree, interactive, pydd_repl, oracle, tree_formatter, answers = ()):
         self.exec_tree = exec_tree
         self.interactive = interactive
         self.pydd_repl = pydd_repl
         self.oracle = oracle
         self.tree_formatter = tree_formatter
+        # consulted in order before the oracle, e.g. calls equivalent to one already asked
+        # or verdicts kept from earlier sessions; every answer is recorded in all of them
+        self.answers = answers
+
+    def ask(self, node):
+        for answers in self.answers:
+            answer = answers.lookup(node)
+            if answer is not None:
+                break
+        else:
+            print(*self.tree_formatter(self.exec_tree.root, node.id))
+
+            answer = self.oracle.query(node)
+
+            if self.interactive and answer == "No":
+                self.pydd_repl(node)
+        for answers in self.answers:
+            answers.record(node, answer)
+        return answer
     
     def single_stepping(self):
         if not self.exec_tree.root:
             return
         queries = []        
-        stack = []
-        visited = []
-        root = self.exec_tree.root
-        stack.append(root)
-        while stack:
-            ptr = stack.pop()
-            visited.append(ptr)
-            if ptr.left_child:
-                stack.append(ptr.left_child)
-            if ptr.right_sibling:
-                stack.append(ptr.right_sibling)
-        while visited:
-            ptr = visited.pop()
+        # every node is asked after the calls it made, the top-level calls one after the other
+        for ptr in chain.from_iterable(postorder(top) for top in siblings(self.exec_tree.root)):
             
-            print(*self.tree_formatter(self.exec_tree.root, ptr.id))
- 
-            answer = self.oracle.query(ptr)
-        
-            if self.interactive and answer == "No":
-                self.pydd_repl(ptr)
+            answer = self.ask(ptr)
 
             if answer == "No":
                 ptr.state = ETNode.State.INVALID
@@ -49,21 +56,11 @@ class DebuggingStrategy:
         if not self.exec_tree.root:
             return
         queries = []
-        queue = []
-        ptr = self.exec_tree.root
-        while ptr:
-            queue.append(ptr)
-            ptr = ptr.right_sibling
+        queue = deque(siblings(self.exec_tree.root))
         while queue:
-            ptr = queue[0]
-            queue.pop(0)
+            ptr = queue.popleft()
 
-            print(*self.tree_formatter(self.exec_tree.root, ptr.id))
- 
-            answer = self.oracle.query(ptr)
-
-            if self.interactive and answer == "No":
-                self.pydd_repl(ptr)
+            answer = self.ask(ptr)
             
             if answer == "Yes":
                 ptr.state = ETNode.State.VALID
@@ -71,8 +68,8 @@ class DebuggingStrategy:
                     print(f"[bold red]Buggy node found at {ptr.parent}[/bold red]")
                     return
                 pptr = ptr.parent
-                pptr.left_child = ptr.right_sibling
-                ptr = ptr.right_sibling
+                pptr.fix_tree(ptr)
+                continue # its right siblings are already queued
             elif answer == "No":
                 ptr.state = ETNode.State.INVALID
                 ptr.right_sibling = None
@@ -82,26 +79,21 @@ class DebuggingStrategy:
                 else:
                     self.exec_tree.root = ptr
                     ptr = ptr.left_child
-                    queue = []
-            while ptr:
-                queue.append(ptr)
-                ptr = ptr.right_sibling
+                    queue.clear()
+            if ptr:
+                queue.extend(siblings(ptr))
 
                                 
     def heaviest_first(self):
         if not self.exec_tree.root:
             return
         queries = []
-        queue = []
-        ptr = self.exec_tree.root
         weights = {}
-        while ptr:
-            queue.append(ptr)
-            ptr = ptr.right_sibling
+        queue = siblings(self.exec_tree.root)
 
         while queue:
             for node in queue:
-                weights[str(node.id)] = (node, node.size())
+                weights[str(node.id)] = (node, node.weight)
             
             queue = []
             if weights:
@@ -110,12 +102,7 @@ class DebuggingStrategy:
             ptr, _ = weights[heaviest]
             del weights[heaviest] # pop from dictionary
             
-            print(*self.tree_formatter(self.exec_tree.root, ptr.id))
- 
-            answer = self.oracle.query(ptr)
-            
-            if self.interactive and answer == "No":
-                self.pydd_repl(ptr)
+            answer = self.ask(ptr)
                             
             if answer == "Yes":
                 ptr.state = ETNode.State.VALID
@@ -136,76 +123,26 @@ class DebuggingStrategy:
                     ptr = ptr.left_child
                     queue = []
                     weights = {}
-            while ptr:
-                queue.append(ptr)
-                ptr = ptr.right_sibling
+            if ptr:
+                queue = siblings(ptr)
 
 
                       
-    def _cleanup(self, weights, node, node_weight):
-        root = self.exec_tree.root        
-        ptr = node
-        while ptr != root:
-            # subtract the node weight from the parent trees (recompute their weights)
-            weights[ptr.parent.id][1] -= node_weight 
-            ptr = ptr.parent
-
-        if not node:
-            return
-        stack = []
-        if node.left_child:
-            stack = [node.left_child]
-            while stack:
-                ptr = stack.pop()
-                if ptr:
-                    del weights[ptr.id]
-                if ptr.right_sibling:
-                    stack.append(ptr.right_sibling)
-                if ptr.left_child:
-                    stack.append(ptr.left_child)
-    
     def divide_and_query(self):
         if not self.exec_tree.root:
             return
         queries = []
-        ptr = self.exec_tree.root
-        root_id = ptr.id
-        
-        def get_weights(root, weights):
-            if not root:
-                return
-            weights[root.id] = [root, 1]
-            lst = get_weights(root.left_child, weights)
-            rst = get_weights(root.right_sibling, weights)
-            if lst:
-                weights[root.id][1] += weights[lst.id][1]
-            if rst:
-                weights[root.parent.id][1] += weights[rst.id][1]
-            return root
-        
-        weights = {}
-        get_weights(ptr, weights)
-        
-        _, total_weight = weights[0]
-        best_weight = total_weight // 2
-               
-        # find the nearest value to best_weight by abs of the 
-        # difference between the target value and the node size
-        best_guess = lambda e: abs(e[1][1] - best_weight) 
+        root = self.exec_tree.root
+        # candidates sorted by subtree weight, the next question is found by bisection
+        index = WeightIndex(self.exec_tree, root)
         while True:
-            if not weights:
+            # the node whose weight is the nearest to half of the suspect region
+            node_id = index.pop_closest(root.weight // 2)
+            if node_id is None:
                 return
-            best = min(weights.items(), key = best_guess) # get best guess
-
-            node_id, (node, node_weight) = best
-            del weights[node_id] # remove from dict not to check it again
+            node = self.exec_tree.node(node_id)
 
-            print(*self.tree_formatter(self.exec_tree.root, node_id))
- 
-            answer = self.oracle.query(node)
-            
-            if self.interactive and answer == "No":
-                self.pydd_repl(node)
+            answer = self.ask(node)
             
             if answer == "Yes":
                 node.state = ETNode.State.VALID
@@ -215,8 +152,7 @@ class DebuggingStrategy:
 
                 pptr = node.parent
                 pptr.fix_tree(node)  # perform tree adjustment
-
-                self._cleanup(weights, node, node_weight)
+                index.prune(node, node.weight)
                 
             elif answer == "No":
                 node.state = ETNode.State.INVALID
@@ -225,11 +161,7 @@ class DebuggingStrategy:
                     print(f"[bold red] Buggy node found at {node} [/bold red]")
                     return
                 else:
-                    root_id = node.id # set the node to be the new tree root
+                    root = node # set the node to be the new tree root
                     self.exec_tree.root = node
-                    weights = {}
-                    get_weights(node, weights)
-
-            _, total_weight = weights[root_id]
-            best_weight = total_weight // 2
+                    index.restrict(node)
             
\ No newline at end of file
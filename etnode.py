@@ -1,46 +1,147 @@
 from enum import Enum
-from event import Event
 from rich.panel import Panel
 from rich import print
 
+NONE = -1
+
 class ETNode:
+    """ View of one node of an ExecutionTree, every attribute is read from and written to the tree's arrays """
     class State(Enum):
         UNKNOWN = 0
         VALID = 1
         INVALID = 2
         TRUSTED = 3
-    
-    def __init__(self, id, name, sig = "", params = {}, source = {}, result = None):
+
+    __slots__ = ("tree", "id")
+
+    def __init__(self, tree, id):
+        self.tree = tree
         self.id = id
-        self.state = ETNode.State.UNKNOWN
-        self.name = name
-        self.sig = sig
-        self.params = params
-        self.m_params = params.copy()
-        self.locals = {}
-        self.source = source
-        self.result = result
-        self.parent = None
-        self.left_child = None
-        self.right_sibling = None
-        
+
+    def node(self, node_id):
+        return ETNode(self.tree, node_id) if node_id != NONE else None
+
+    @property
+    def name(self):
+        return self.tree.names[self.tree.name_ids[self.id]]
+
+    @property
+    def qualname(self):
+        # the function's __qualname__, name is the one shown to the user
+        return self.tree.names[self.tree.qualname_ids[self.id]]
+
+    @property
+    def sig(self):
+        return self.tree.sigs[self.id]
+
+    @property
+    def source(self):
+        return self.tree.sources[self.id]
+
+    @property
+    def state(self):
+        return STATES[self.tree.states[self.id]]
+
+    @state.setter
+    def state(self, state):
+        self.tree.states[self.id] = state.value
+
+    @property
+    def params(self):
+        return self.tree.params[self.id]
+
+    @params.setter
+    def params(self, params):
+        self.tree.params[self.id] = params
+
+    @property
+    def m_params(self):
+        # copied from params the first time it is needed
+        m_params = self.tree.m_params[self.id]
+        if m_params is None:
+            m_params = self.tree.m_params[self.id] = self.params.copy()
+        return m_params
+
+    @m_params.setter
+    def m_params(self, m_params):
+        self.tree.m_params[self.id] = m_params
+
+    @property
+    def locals(self):
+        f_locals = self.tree.locals[self.id]
+        if f_locals is None:
+            f_locals = self.tree.locals[self.id] = {}
+        return f_locals
+
+    @locals.setter
+    def locals(self, f_locals):
+        self.tree.locals[self.id] = f_locals
+
+    @property
+    def result(self):
+        return self.tree.results[self.id]
+
+    @result.setter
+    def result(self, result):
+        self.tree.results[self.id] = result
+
+    @property
+    def partial(self):
+        # some line events were not recorded
+        return self.id in self.tree.partial
+
+    @partial.setter
+    def partial(self, partial):
+        if partial:
+            self.tree.partial.add(self.id)
+        else:
+            self.tree.partial.discard(self.id)
+
+    @property
+    def parent(self):
+        return self.node(self.tree.parents[self.id])
+
+    @parent.setter
+    def parent(self, node):
+        self.tree.parents[self.id] = node.id if node else NONE
+
+    @property
+    def left_child(self):
+        return self.node(self.tree.first_child[self.id])
+
+    @left_child.setter
+    def left_child(self, node):
+        self.tree.first_child[self.id] = node.id if node else NONE
+        if not node:
+            self.tree.last_child[self.id] = NONE
+
+    @property
+    def right_sibling(self):
+        return self.node(self.tree.next_sibling[self.id])
+
+    @right_sibling.setter
+    def right_sibling(self, node):
+        self.tree.next_sibling[self.id] = node.id if node else NONE
+        parent_id = self.tree.parents[self.id]
+        if not node and parent_id != NONE:
+            # keep the tail pointer of the parent on the new last child
+            self.tree.last_child[parent_id] = self.id
+
     def __eq__(self, other):
         if isinstance(other, ETNode):
-            return self.id == other.id and \
-                self.name == other.name and \
-                    self.parent == other.parent
+            return self.id == other.id and self.tree is other.tree
         return False
-            
+
+    def __hash__(self):
+        return hash(self.id)
+
     def _get_children(self):
         children = []
-        ptr = self.left_child
-        if ptr:
-            children.append(ptr)
-            if ptr.right_sibling:
-                ptr = ptr.right_sibling
-                while ptr:
-                    children.append(ptr)
-                    ptr = ptr.right_sibling
+        first_child, next_sibling = self.tree.first_child, self.tree.next_sibling
+        child_id = first_child[self.id]
+        while child_id != NONE:
+            children.append(ETNode(self.tree, child_id))
+            child_id = next_sibling[child_id]
         return children
 
     def __str__(self):
@@ -50,40 +151,34 @@ class ETNode:
         if not self.locals:
             self.locals = updated_locals.copy()
         self.locals.update(updated_locals)
-    
+
     def is_leaf(self):
-        return not bool(self.left_child)
-    
+        return self.tree.first_child[self.id] == NONE
+
     def is_terminal(self):
-        return not bool(self.right_sibling)
-    
+        return self.tree.next_sibling[self.id] == NONE
+
+    @property
+    def weight(self):
+        # number of nodes in the subtree, kept up to date as subtrees are pruned
+        return self.tree.weights[self.id]
+
     def size(self):
-        if not self.left_child:
-            return 1
-        ptr = self.left_child
-        queue = [ptr]
-        count = 1
-        while queue:
-            ptr = queue.pop(0)
-            if ptr.left_child:
-                queue.append(ptr.left_child)
-                count += 1
-            if ptr.right_sibling:
-                queue.append(ptr.right_sibling)
-                count += 1
-        count += 1
-        return count
-         
+        return self.weight
+
     def fix_tree(self, node):
-        if self.left_child == node:
-            if node.right_sibling:
-                self.left_child = node.right_sibling
-            else:
-                self.left_child = None
+        # unlinks node from the children of self, scanning the sibling array rather than views
+        first_child, next_sibling = self.tree.first_child, self.tree.next_sibling
+        following = next_sibling[node.id]
+        if first_child[self.id] == node.id:
+            self.left_child = node.right_sibling
         else:
-            ptr = self.left_child
-            while ptr.right_sibling != node:
-                ptr = ptr.right_sibling
-            ptr.right_sibling = node.right_sibling # either None or the node's
-        
-        
\ No newline at end of file
+            ptr_id = first_child[self.id]
+            while next_sibling[ptr_id] != node.id:
+                ptr_id = next_sibling[ptr_id]
+            next_sibling[ptr_id] = following # either NONE or the node's
+            if following == NONE:
+                self.tree.last_child[self.id] = ptr_id
+        self.tree.discount(self.id, node.weight)
+
+STATES = tuple(ETNode.State)
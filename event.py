@@ -1,12 +1,22 @@
-from dataclasses import dataclass
+from array import array
 
-@dataclass
 class Event:
-    timestamp: float
-    event: str
-    lineno: int 
-    line: str
-    locals: dict
+    """ Line event: the source text is looked up in the node's source map when needed """
+    __slots__ = ("node_id", "lineno", "timestamp", "locals", "source")
+    event = "line"
+
+    def __init__(self, node_id, lineno, timestamp, locals, source = None):
+        self.node_id = node_id
+        self.lineno = lineno
+        self.timestamp = timestamp # time.monotonic_ns()
+        self.locals = locals
+        self.source = source
+
+    @property
+    def line(self):
+        if not self.source:
+            return ""
+        return self.source.get(self.lineno, "").rstrip("\n")
     
     def __repr__(self):
         # return f"{self.event} {self.lineno} {self.line}"
@@ -27,4 +37,78 @@ class Event:
                 self.line == other.line
     
     def __hash__(self):
-        return hash((self.lineno, self.line))
\ No newline at end of file
+        return hash((self.lineno, self.line))
+
+
+class EventBuffer:
+    """ In-memory trace store with the interface of the trace log. Events are
+    kept as per-node parallel arrays and only rebuilt as Event objects on access. """
+    def __init__(self):
+        self.nodes = {}
+        self.sources = {}
+
+    def append(self, node_id, event):
+        try:
+            linenos, timestamps, f_locals = self.nodes[node_id]
+        except KeyError:
+            linenos, timestamps, f_locals = self.nodes[node_id] = (array("I"), array("q"), [])
+            self.sources[node_id] = event.source
+        linenos.append(event.lineno)
+        timestamps.append(event.timestamp)
+        f_locals.append(event.locals or None)
+
+    def event(self, node_id, index):
+        linenos, timestamps, f_locals = self.nodes[node_id]
+        return Event(node_id, linenos[index], timestamps[index], f_locals[index] or {}, self.sources[node_id])
+
+    def keys(self):
+        return [str(node_id) for node_id in self.nodes]
+
+    def items(self):
+        return [(str(node_id), self[node_id]) for node_id in self.nodes]
+
+    def get(self, node_id, default = None):
+        if node_id in self:
+            return self[node_id]
+        return default
+
+    def __contains__(self, node_id):
+        return int(node_id) in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, node_id):
+        return BufferView(self, int(node_id))
+
+    def close(self):
+        pass
+
+
+class BufferView:
+    def __init__(self, buffer, node_id):
+        self.buffer = buffer
+        self.node_id = node_id
+        self.linenos, _, self.f_locals = buffer.nodes[node_id]
+
+    def __len__(self):
+        return len(self.linenos)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event index out of range")
+        return self.buffer.event(self.node_id, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def lineno(self, index):
+        return self.linenos[index]
+
+    def has_locals(self, index):
+        return self.f_locals[index] is not None
@@ -1,55 +1,181 @@
-from etnode import ETNode
+from etnode import ETNode, NONE
+from traversal import preorder, levels, siblings, child_ids, sibling_ids, preorder_ids, postorder_ids
+from array import array
+from itertools import chain
 from query import Query
 from rich import print
 import json
 
-class ExecutionTree:    
-    def __init__(self, root = None):
-        self.root = root
+class ExecutionTree:
+    """ Call tree stored as parallel arrays indexed by node id, ETNode objects are views over them """
+    def __init__(self):
+        self.root_id = NONE
+        self.last_root = NONE
         self.size = 0
-        
-    def insert_at(self, parent, node):
-        if not self.root:
-            self.root = node
+        # structure
+        self.parents = array("q")
+        self.first_child = array("q")
+        self.last_child = array("q")
+        self.next_sibling = array("q")
+        self.weights = array("Q") # subtree sizes, complete once every call has returned
+        self.ends = array("q") # a subtree's ids are the preorder range [id, end)
+        self.states = array("B")
+        self.name_ids = array("I")
+        self.qualname_ids = array("I")
+        self.names = []
+        self.name_table = {}
+        # payload
+        self.sigs = []
+        self.sources = []
+        self.params = []
+        self.m_params = []
+        self.locals = []
+        self.results = []
+        self.partial = set()
+
+    @property
+    def root(self):
+        return ETNode(self, self.root_id) if self.root_id != NONE else None
+
+    @root.setter
+    def root(self, node):
+        self.root_id = node.id if node else NONE
+
+    def intern(self, name):
+        try:
+            return self.name_table[name]
+        except KeyError:
+            self.names.append(name)
+            name_id = self.name_table[name] = len(self.names) - 1
+            return name_id
+
+    def insert(self, parent, name, sig = "", params = {}, source = {}, result = None, qualname = None):
+        """ Appends a new last child of parent (a new top-level node if parent is None) in O(1) """
+        node_id = len(self.parents)
+        parent_id = parent.id if parent else NONE
+        self.parents.append(parent_id)
+        self.first_child.append(NONE)
+        self.last_child.append(NONE)
+        self.next_sibling.append(NONE)
+        self.weights.append(1)
+        self.ends.append(node_id + 1)
+        self.states.append(ETNode.State.UNKNOWN.value)
+        self.name_ids.append(self.intern(name))
+        self.qualname_ids.append(self.intern(qualname or name))
+        self.sigs.append(sig)
+        self.sources.append(source)
+        self.params.append(params)
+        self.m_params.append(None)
+        self.locals.append(None)
+        self.results.append(result)
+        if parent_id == NONE:
+            # further top-level calls become siblings of the root
+            if self.root_id == NONE:
+                self.root_id = node_id
+            else:
+                self.next_sibling[self.last_root] = node_id
+            self.last_root = node_id
         else:
-            ptr = parent.left_child
-            if ptr:
-                if ptr.right_sibling:
-                    while ptr.right_sibling:
-                        ptr = ptr.right_sibling
-                    ptr.right_sibling = node
-                node.parent = parent
-                ptr.right_sibling = node
+            last = self.last_child[parent_id]
+            if last == NONE:
+                self.first_child[parent_id] = node_id
             else:
-                node.parent = parent
-                parent.left_child = node
+                self.next_sibling[last] = node_id
+            self.last_child[parent_id] = node_id
         self.size += 1
+        return ETNode(self, node_id)
+
+    def node(self, node_id):
+        return ETNode(self, node_id)
+
+    def close(self, node):
+        # called when the call returns, its subtree is final by then
+        self.ends[node.id] = len(self.parents)
+        parent_id = self.parents[node.id]
+        if parent_id != NONE:
+            self.weights[parent_id] += self.weights[node.id]
+
+    def discount(self, node_id, weight):
+        # a subtree of this weight was pruned below node_id
+        parents, weights = self.parents, self.weights
+        while node_id != NONE:
+            weights[node_id] -= weight
+            node_id = parents[node_id]
     
+    def root_ids(self):
+        return list(sibling_ids(self, self.root_id))
+
+    def splice(self, parent_id, absorbed):
+        """ Replaces each child of parent_id for which absorbed(child_id) is true by its own
+        children, recursively, returns the number of nodes taken out. Their ids are kept, so
+        every subtree is still within its preorder range; weights are left to reweigh. """
+        children = []
+        stack = list(child_ids(self, parent_id))[::-1]
+        removed = 0
+        while stack:
+            node_id = stack.pop()
+            if absorbed(node_id):
+                stack.extend(list(child_ids(self, node_id))[::-1])
+                removed += 1
+            else:
+                children.append(node_id)
+        if not removed:
+            return 0
+        self.first_child[parent_id] = children[0] if children else NONE
+        self.last_child[parent_id] = children[-1] if children else NONE
+        for node_id, next_id in zip(children, children[1:] + [NONE]):
+            self.parents[node_id] = parent_id
+            self.next_sibling[node_id] = next_id
+        return removed
+
+    def splice_all(self, absorbed):
+        # top-level calls are never taken out
+        removed = 0
+        for root_id in self.root_ids():
+            for node_id in preorder_ids(self, root_id):
+                # the walk reads the children of node_id after they were spliced
+                removed += self.splice(node_id, absorbed)
+        if removed:
+            self.reweigh()
+        return removed
+
+    def reweigh(self):
+        weights = self.weights
+        for root_id in self.root_ids():
+            for node_id in postorder_ids(self, root_id):
+                weights[node_id] = 1 + sum(weights[child_id] for child_id in child_ids(self, node_id))
+
+    def drop_trusted(self):
+        """ Takes the calls marked trusted out of the tree, the calls they made that are not
+        trusted move up to the nearest caller that is not, returns how many were taken out """
+        states, trusted = self.states, ETNode.State.TRUSTED.value
+        return self.splice_all(lambda node_id : states[node_id] == trusted)
+
     @classmethod
     def to_ascii(cls, node, curr_id, prefix = ""):
-        def format_tree(node, curr_id, prefix = "", ls = []):
+        ls = []
+        prefixes = {node.id : prefix}
+        for ptr in preorder(node):
+            prefix = prefixes.pop(ptr.id)
             connector = "└── " 
-            if not node.is_terminal():
+            if not ptr.is_terminal():
                 connector = "├── "
             st = f"{prefix}{connector}"
-            if node.state == ETNode.State.INVALID:
-                st += f"[red]{str(node)}[/red]"
+            if ptr.state == ETNode.State.INVALID:
+                st += f"[red]{str(ptr)}[/red]"
             else:
-                st += f"[yellow]{str(node)}[/yellow]"
-            if node.id == curr_id:
+                st += f"[yellow]{str(ptr)}[/yellow]"
+            if ptr.id == curr_id:
                 st += f"\t[gray]<-[/gray]"
             ls.append(st + "\n")
-            children = node._get_children()
-            for child in children:
-                new_prefix = prefix
-                if node.is_terminal():
-                    new_prefix += "    "
-                else:
-                    new_prefix += "│   "
-                format_tree(child, curr_id, new_prefix, ls)
-            return ls
-        tree = format_tree(node, curr_id, "", [])
-        return tree
+            new_prefix = prefix
+            if ptr.is_terminal():
+                new_prefix += "    "
+            else:
+                new_prefix += "│   "
+            for child_id in child_ids(ptr.tree, ptr.id):
+                prefixes[child_id] = new_prefix
+        return ls
 
     @classmethod
     def to_json(cls, node, curr_id):
@@ -61,33 +187,28 @@ class ExecutionTree:
         }
         YELLOW = "#f7dc6f"
         BLUE = "#3498db"
-        def populate_table(node, nodes, edges):
-            if not node:
-                return
-            nodes.append({"id" : node.id,
-                          "label" : str(node),
-                          "title" : f"Arguments\n{str(node.params)}\n \
-                                     Modified\n{str(node.m_params)}\n \
-                                     Returned\n{str(node.result)}",
+        nodes, edges = t_table["tree"]["nodes"], t_table["tree"]["edges"]
+        # the node's right siblings too, e.g. the top-level calls after the root
+        for ptr in chain.from_iterable(preorder(top) for top in siblings(node)):
+            nodes.append({"id" : ptr.id,
+                          "label" : str(ptr),
+                          "title" : f"Arguments\n{str(ptr.params)}\n \
+                                     Modified\n{str(ptr.m_params)}\n \
+                                     Returned\n{str(ptr.result)}",
                          "color" : {
                              "background": YELLOW,
                              "border": YELLOW
                              }
                          })
-            if node.id == curr_id:
+            if ptr.id == curr_id:
                 curr_node = nodes[-1]
                 curr_node["color"] = {
                     "background": BLUE,
                     "border": BLUE
                 }
-            if node.left_child:
-                edges.setdefault(node.id, []).append({"from" : node.id, "to" : node.left_child.id})
-                populate_table(node.left_child, nodes, edges)
-            if node.right_sibling:
-                edges.setdefault(node.parent.id, []).append({"from" : node.parent.id, "to" : node.right_sibling.id})
-                populate_table(node.right_sibling, nodes, edges)
+            for child_id in child_ids(ptr.tree, ptr.id):
+                edges.setdefault(ptr.id, []).append({"from" : ptr.id, "to" : child_id})
 
-        populate_table(node, **t_table["tree"])
         edge_list = []
         for ls in t_table["tree"]["edges"].values():
             edge_list.extend(ls)
@@ -98,12 +219,7 @@ class ExecutionTree:
     def height(self, root):
         if not root:
             return 0
-        h = 0
-        ptr = root.left_child
-        while ptr:
-            h = max(h, self.height(ptr))
-            ptr = ptr.right_sibling
-        return h + 1
+        return sum(1 for _ in levels(root))
                    
     def visit(self, node):
         print(str(node))
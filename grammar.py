@@ -1,14 +1,23 @@
+from itertools import product
+from heapq import heappush, heappop
+import math
 import re
-import copy
-from astor import to_source
-from ast_transformer import ASTTransformer
-import ast
-import astunparse
+from candidate_evaluator import CandidateEvaluator, Template, batched
 from rich import print
 from rich.syntax import Syntax
 
+def compositions(total, parts):
+    """ The ways of writing total as an ordered sum of parts positive sizes """
+    if parts == 0:
+        if total == 0:
+            yield ()
+        return
+    for first in range(1, total - parts + 2):
+        for rest in compositions(total - first, parts - 1):
+            yield (first, *rest)
+
 class Grammar:
-    def __init__(self, terminals = (), start_symbol = None):
+    def __init__(self, terminals = (), start_symbol = None, jobs = 1):
         self.terminals = {*terminals}
         self.nonterminals = {start_symbol}
         self.start_symbol = start_symbol
@@ -17,6 +26,16 @@ class Grammar:
         self.test_results = {}
         self.best_match = None
         self.sem_specs = None
+        # bus programs, as tuples of tokens, by (nonterminal, number of terminals)
+        self.bank = {}
+        # (nonterminal, outputs on the sem-spec inputs) of the programs in the bank
+        self.signatures = {}
+        # worker processes testing candidates, 1 tests them in this process
+        self.jobs = jobs
+        # occurrences of each token in the source around the fault, the cost model of bestfs
+        self.token_counts = {}
+        # partial programs expanded by bfs and bestfs
+        self.expansions = 0
         
     def add_rule(self, symbol, rule):
         if rule and isinstance(rule, tuple):
@@ -30,14 +49,6 @@ class Grammar:
         tokens = re.split("[\s]+", word)
         return tokens
     
-    def _len(self, word):
-        _, terminals = zip(*self.terminals)
-        terminals = list(terminals)
-        terminals.remove("+")
-        terminals.append("\+")
-        terminal_tokens = re.findall(f"({'|'.join(terminals)})", word)
-        return len(terminal_tokens)
-
     def is_nonterminal(self, symbol):
         return symbol in self.nonterminals
             
@@ -47,62 +58,68 @@ class Grammar:
     def is_valid(self, word):
         return all([self.is_terminal(token) for token in self.tokenize(word)])
     
-    def remove_equiv(self, programs):
+    def signature(self, p):
+        """ The outputs of p on the sem-spec inputs, None for an input it raises on. None as a whole
+        if p reads a name the inputs do not bind, e.g. a local of the function: its behaviour
+        cannot be observed here """
+        try:
+            code = compile(p, filename = "<string>", mode = "eval")
+        except SyntaxError:
+            return None
+        outputs = []
+        for inputs, _ in self.sem_specs:
+            try:
+                outputs.append(repr(eval(code, inputs.copy())))
+            except NameError:
+                return None
+            except Exception:
+                outputs.append(None)
+        return tuple(outputs)
+
+    def remove_equiv(self, nonterminal, programs):
+        """ Keeps the programs of nonterminal that behave differently on the sem-spec inputs from
+        every program kept before, in this size or a smaller one """
         equiv = []
-        results = []
         for program in programs:
-            p_type, p = program
-            outputs = []
-            for inputs, _ in self.sem_specs:
-                try:
-                    outputs.append(eval(program[1], inputs.copy()))
-                except Exception:
-                    pass
-            builtins = self.rules["BuiltinId"]
-            if any(builtin in p for builtin in builtins) \
-                or outputs not in results:
-                results.append(outputs)
+            p = " ".join(program)
+            signature = self.signature(p)
+            if signature is None or self.signatures.setdefault((nonterminal, signature), p) == p:
                 equiv.append(program)
         return equiv
             
     def is_match(self, args, p):
-        f_name, tree, faulty_node, ret_val = args
-        tree = copy.deepcopy(tree)
-        to_source(tree)
-        tests = {}
-        match = False
         if isinstance(p, tuple):
             p = p[1]
-        mutated_tree = ASTTransformer(p, faulty_node).visit(tree)
-        mutated_tree = ast.fix_missing_locations(mutated_tree) # fix up line numbers
-        
-        mutated_source = astunparse.unparse(mutated_tree.body[0])
-        mutated_source = compile(mutated_source, filename = "<string>", mode = "exec")
+        tests = Template(*args, self.sem_specs).run(p)
+        self.record(p, tests)
+        return all(match for _, match in tests)
 
-        for inputs, outputs in self.sem_specs:
-            _locals = copy.deepcopy(inputs)
-            if isinstance(outputs, str):
-                outputs = _locals[outputs]
-            try:
-                exec(mutated_source, globals())
-                temp = globals()[f_name](**_locals)
-                try:
-                    res = _locals[ret_val]
-                except KeyError:
-                    res = temp
-                if outputs == res:
-                    match = True
-                else:
-                    match = False
-            except Exception as e:
-                match = False
-            finally:
-                tests.setdefault(p, []).append((inputs, match))
+    def record(self, p, tests):
         if p and p not in self.test_results:
-            self.test_results[p] = (tests[p], self.score(tests))
-        del globals()[f_name]
-        match = all(match for _, match in tests[p])
-        return match
+            self.test_results[p] = (tests, self.score({p : tests}))
+
+    def search(self, args, batches):
+        """ Tests the batches of candidates in order with jobs processes, returns the first candidate
+        that passes every sem-spec """
+        def unseen():
+            # a candidate enumerated again has already failed
+            seen = set()
+            for batch in batches:
+                fresh = []
+                for p in batch:
+                    if p not in seen:
+                        seen.add(p)
+                        fresh.append(p)
+                if fresh:
+                    yield fresh
+        with CandidateEvaluator(*args, self.sem_specs, jobs = self.jobs) as evaluator:
+            p = evaluator.first_match(unseen(), self.record)
+        if p is not None:
+            print("\nGenerated matching expression: ", Syntax(p, "python", theme="ansi_light"))
+        return p
+
+    def batch_size(self):
+        return self.jobs * CandidateEvaluator.chunk_size
     
     def score(self, tests):
         score = 0
@@ -121,86 +138,158 @@ class Grammar:
         return score
     
     def bus(self, args):
-        f_name, tree, faulty_node, ret_val = args
-        bank = [*self.terminals]
-        size = 1
+        return self.search(args, self.bus_candidates())
+
+    def bus_candidates(self):
+        self.bank = {}
+        self.signatures = {}
         bound = 10
-        while size <= bound:
+        for size in range(1, bound + 1):
             print(f"Running iteration of size {size}...")
-            for p in bank:
-                if self.is_match(args, p):
-                    p = Syntax(p[1], "python", theme="ansi_light")
-                    print("\nGenerated matching expression: ", p)
-                    return p
-            bank += self.grow(bank, size)
-            size += 1
+            grown, kept = self.grow(size)
+            pruned = 1 - kept / grown if grown else 0
+            print(f"Bank size {sum(map(len, self.bank.values()))}: {kept} of {grown} new programs kept, {pruned:.0%} pruned as equivalent")
+            # one batch per size, growing the bank is the expensive part
+            yield [" ".join(program) for program in self.bank.get((self.start_symbol, size), ())]
     
-    def grow(self, bank, size):
-        temp_bank = []
-        rhs = []
-        for nonterminal, rules in self.rules.items():
-            for rule in rules:
-                def expand(prod_rule):
-                    program = " ".join(prod_rule)
-                    if program not in bank:
-                        for i, token in enumerate(prod_rule):
-                            for j, p in enumerate(bank):
-                                p_type, p = p
-                                if self.is_nonterminal(token):
-                                    if p_type == token or \
-                                        p_type in self.rules[token]:
-                                        temp = prod_rule.copy()
-                                        temp[i] = p
-                                        expand(temp)
-                        if self.is_valid(program) and \
-                            self._len(program) == size:
-                            node = (nonterminal, program)
-                            if node not in temp_bank:
-                                temp_bank.append(node)
-                expand(self.tokenize(rule))        
-        temp_bank = self.remove_equiv(temp_bank)
-        return temp_bank
+    def grow(self, size):
+        """ Adds the programs of size terminals of every nonterminal to the bank, returns how many
+        were built and how many of them were kept """
+        counts = [0, 0]
+        def programs(nonterminal):
+            # a unit rule (Expr -> FnCall) needs the programs of the same size of another nonterminal
+            key = (nonterminal, size)
+            if key not in self.bank:
+                self.bank[key] = []
+                built = []
+                for rule in self.rules.get(nonterminal, ()):
+                    built.extend(self.combine(self.tokenize(rule), size, programs))
+                built = list(dict.fromkeys(built))
+                self.bank[key] = self.remove_equiv(nonterminal, built)
+                counts[0] += len(built)
+                counts[1] += len(self.bank[key])
+            return self.bank[key]
+        for nonterminal in self.rules:
+            programs(nonterminal)
+        return counts
+
+    def combine(self, tokens, size, programs):
+        """ The programs of size terminals a rule derives, its nonterminals replaced by programs
+        of the bank whose sizes sum up to what the rule's own terminals leave """
+        terminals = {terminal for _, terminal in self.terminals}
+        slots = [i for i, token in enumerate(tokens) if self.is_nonterminal(token)]
+        rest = size - sum(token in terminals for token in tokens)
+        for sizes in compositions(rest, len(slots)):
+            choices = [programs(tokens[i]) if k == size else self.bank.get((tokens[i], k), ())
+                       for i, k in zip(slots, sizes)]
+            for picks in product(*choices):
+                program = []
+                picks = iter(picks)
+                for i, token in enumerate(tokens):
+                    if i in slots:
+                        program.extend(next(picks))
+                    else:
+                        program.append(token)
+                yield tuple(program)
 
     def iddfs(self, args):
-        f_name, tree, faulty_node, ret_val = args
+        return self.search(args, batched(self.iddfs_candidates(), self.batch_size()))
+
+    def iddfs_candidates(self):
         d = 1
-        while not self.dfs(args, self.start_symbol, d):
+        while True:
+            yield from self.dfs(self.start_symbol, d)
             print(f"Running iteration of depth {d}...")
             d += 1
     
-    def dfs(self, args, p, depth):
-        if self.is_valid(p):
-            if self.is_match(args, p):
-                p = Syntax(p, "python", theme="ansi_light")
-                print("\nGenerated matching expression: ", p)
-                return True
-        children = self.children(p)
-        if not children or depth == 0:
-            return False
-        for c in children:
-            result = self.dfs(args, c, depth - 1)
-            if result:
-                return True
-        return False
+    def dfs(self, p, depth):
+        stack = [(p, depth)]
+        while stack:
+            p, depth = stack.pop()
+            if self.is_valid(p):
+                yield p
+            children = self.children(p)
+            if children and depth > 0:
+                stack.extend((c, depth - 1) for c in reversed(children))
 
     def bfs(self, args):
-        f_name, tree, faulty_node, ret_val = args
+        return self.search(args, batched(self.bfs_candidates(), self.batch_size()))
+
+    def bfs_candidates(self):
         queue = [self.start_symbol]
-        it = 0
         while queue:
             p = queue.pop(0)
+            self.expansions += 1
             children = self.children(p)
             if children:
                 for c in children:
                     if self.is_valid(c):
-                        if self.is_match(args, c):
-                            c = Syntax(c, "python", theme="ansi_light")
-                            print("\nGenerated matching expression: ", c)
-                            return c
+                        yield c
                     queue.append(c)
             queue = sorted(queue, key=len)
-            it += 1
         
+    def bestfs(self, args):
+        return self.search(args, batched(self.bestfs_candidates(), self.batch_size()))
+
+    def bestfs_candidates(self):
+        """ Best-first search over partial programs. A terminal costs how unlikely it is near the
+        fault, a nonterminal the cheapest way to complete it, so complete programs come out
+        cheapest first, the smallest first when the source says nothing, and a partial program
+        is only expanded while it can still beat them. """
+        terminals = {terminal for _, terminal in self.terminals}
+        total = sum(self.token_counts.get(terminal, 0) for terminal in terminals) + len(terminals)
+        weights = {terminal : -math.log((self.token_counts.get(terminal, 0) + 1) / total) for terminal in terminals}
+        bounds = self.min_costs(weights)
+        def cost(p):
+            total = 0.0
+            for token in self.tokenize(p):
+                if token in weights:
+                    total += weights[token]
+                elif self.is_nonterminal(token):
+                    if token not in bounds:
+                        # derives no program
+                        return None
+                    total += bounds[token]
+            return total
+        heap = [(cost(self.start_symbol), self.start_symbol)]
+        visited = {self.start_symbol}
+        while heap:
+            _, p = heappop(heap)
+            if self.is_valid(p):
+                yield p
+                continue
+            self.expansions += 1
+            for c in self.children(p):
+                if c in visited:
+                    continue
+                visited.add(c)
+                c_cost = cost(c)
+                if c_cost is not None:
+                    heappush(heap, (c_cost, c))
+
+    def min_costs(self, weights):
+        """ The least total weight of the terminals each nonterminal derives, nonterminals that
+        derive nothing are left out """
+        costs = {}
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, rules in self.rules.items():
+                for rule in rules:
+                    total = 0.0
+                    for token in self.tokenize(rule):
+                        if self.is_nonterminal(token):
+                            if token not in costs:
+                                break
+                            total += costs[token]
+                        else:
+                            total += weights.get(token, 0.0)
+                    else:
+                        if total < costs.get(nonterminal, math.inf):
+                            costs[nonterminal] = total
+                            changed = True
+        return costs
+
     def children(self, p):        
         nt = None
         p_tokens = self.tokenize(p)
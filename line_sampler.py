@@ -0,0 +1,99 @@
+from collections import deque
+
+class LineSampler:
+    """ Bounds the line events recorded per call: all of them ("full"), none ("calls"),
+    one in every n ("sample:n") or the first n and the last n ("ring:n"). "light" records
+    none either, the calls are re-executed to rebuild their trace when it is needed. """
+    modes = ("full", "calls", "light", "sample", "ring")
+
+    def __init__(self, mode = "full", n = 0):
+        if mode not in self.modes:
+            raise ValueError(f"{mode}: unknown trace mode.")
+        if mode in ("sample", "ring") and n < 1:
+            raise ValueError(f"{mode}: expected a positive event count.")
+        self.mode = mode
+        self.n = n
+        self.bounded = mode != "full"
+        self.counts = {}
+        self.rings = {}
+        self.covered = {}
+        self.held = {}
+        self.dropped = 0
+
+    @classmethod
+    def parse(cls, spec):
+        mode, _, n = spec.partition(":")
+        if n and not n.isdigit():
+            raise ValueError(f"{spec}: expected a positive event count.")
+        return cls(mode, int(n or 0))
+
+    def __str__(self):
+        return f"{self.mode}:{self.n}" if self.n else self.mode
+
+    def lines_enabled(self):
+        return self.mode not in ("calls", "light")
+
+    def start(self, node):
+        if self.mode == "calls":
+            node.partial = True
+
+    def skip(self, node):
+        # sampling decides before the locals are diffed, only the parameters are diffed on
+        # dropped lines and the next recorded event carries what they changed
+        if self.mode != "sample":
+            return False
+        count = self.counts.get(node.id, 0)
+        self.counts[node.id] = count + 1
+        if count % self.n:
+            node.partial = True
+            self.dropped += 1
+            return True
+        return False
+
+    def hold(self, node, changed):
+        try:
+            self.held[node.id].update(changed)
+        except KeyError:
+            self.held[node.id] = changed
+
+    def release(self, node):
+        return self.held.pop(node.id, None)
+
+    def covers(self, node_id, lineno):
+        # bounded traces still report every distinct line a call executed
+        try:
+            lines = self.covered[node_id]
+        except KeyError:
+            lines = self.covered[node_id] = set()
+        if lineno in lines:
+            return False
+        lines.add(lineno)
+        return True
+
+    def admit(self, node, event):
+        """ Returns the event if it is recorded now, None if it was kept back in the ring """
+        if self.mode != "ring":
+            return event
+        count = self.counts.get(node.id, 0)
+        self.counts[node.id] = count + 1
+        if count < self.n:
+            return event
+        try:
+            ring = self.rings[node.id]
+        except KeyError:
+            ring = self.rings[node.id] = deque()
+        ring.append(event)
+        if len(ring) > self.n:
+            evicted = ring.popleft()
+            # events only carry what changed, so the next one inherits the dropped changes
+            if evicted.locals:
+                ring[0].locals = {**evicted.locals, **ring[0].locals}
+            node.partial = True
+            self.dropped += 1
+        return None
+
+    def flush(self, node):
+        self.counts.pop(node.id, None)
+        self.covered.pop(node.id, None)
+        self.held.pop(node.id, None)
+        return self.rings.pop(node.id, ())
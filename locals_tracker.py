@@ -0,0 +1,49 @@
+class LocalsTracker:
+    # values of these types cannot change without being rebound
+    immutable_types = (int, float, complex, bool, str, bytes, range, type(None))
+
+    def __init__(self):
+        self.shadows = {}
+    
+    def start(self, key, bindings, snapshot):
+        shadow = self.shadows[key] = {}
+        captured = {}
+        for name, value in bindings.items():
+            captured[name] = snapshot(name, value, None)
+            shadow[name] = (value, captured[name])
+        return captured
+    
+    def stop(self, key):
+        self.shadows.pop(key, None)
+    
+    def diff(self, key, bindings, snapshot):
+        shadow = self.shadows.setdefault(key, {})
+        changed = {}
+        for name, value in bindings.items():
+            entry = shadow.get(name)
+            if entry is not None and self.unchanged(entry, value):
+                continue
+            captured = snapshot(name, value, entry[1] if entry else None)
+            if entry is None or not self.equals(entry[1], captured):
+                changed[name] = captured
+                shadow[name] = (value, captured)
+            else:
+                shadow[name] = (value, entry[1])
+        return changed
+    
+    def unchanged(self, entry, value):
+        ref, captured = entry
+        if ref is not value:
+            return False
+        if type(value) in self.immutable_types:
+            return True
+        if hasattr(value, "__dict__"):
+            # object snapshots are attribute dicts, only comparable after a new snapshot
+            return False
+        return self.equals(captured, value)
+    
+    def equals(self, a, b):
+        try:
+            return bool(a == b)
+        except Exception:
+            return False
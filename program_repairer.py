@@ -7,9 +7,12 @@ import re
 import copy
 import builtins
 import time
+import io
+import tokenize
+from collections import Counter
 
 class ProgramRepairer:
-    def __init__(self, f_name, source, lineno, ret_val, sem_specs = None):
+    def __init__(self, f_name, source, lineno, ret_val, sem_specs = None, jobs = 1):
         self.f_name = f_name
         self.source = dedent(source)
         self.tree = ast.parse(dedent(source))
@@ -18,6 +21,7 @@ class ProgramRepairer:
         self.sem_specs = sem_specs
         self.grammar = None
         self.accepted_types = [ast.Compare, ast.Assign]
+        self.jobs = jobs
 
     @classmethod
     def parse_expr(cls, expr):
@@ -97,7 +101,7 @@ class ProgramRepairer:
         for name in builtin_ids:
             terminals.append(("BuiltinId", name))
             
-        self.grammar = Grammar(terminals = terminals, start_symbol= start_symbol)
+        self.grammar = Grammar(terminals = terminals, start_symbol= start_symbol, jobs = self.jobs)
         self.grammar.add_rule("Expr", ("Id", "FnCall", "Expr BinOp Expr"))
         self.grammar.add_rule("FnCall", ("BuiltinId ( ArgsList )",))
         self.grammar.add_rule("BuiltinId", (*builtin_ids,))
@@ -105,7 +109,22 @@ class ProgramRepairer:
         self.grammar.add_rule("BinOp", (*binops,))
         self.grammar.add_rule("Id", (*ids,))
         # self.grammar.add_rule("Num", (*digits,))
+        self.grammar.token_counts = self.token_counts()
         if self.sem_specs:
             self.grammar.sem_specs = self.sem_specs
 
+    def token_counts(self, window = 2):
+        """ Occurrences of each name and operator within window lines of the faulty line, each
+        line closer to it counting eight times as much: a repair mostly reuses the faulty line """
+        _, lineno = self.faulty_node
+        counts = Counter()
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(self.source).readline):
+                distance = abs(token.start[0] - lineno)
+                if token.type in (tokenize.NAME, tokenize.OP) and distance <= window:
+                    counts[token.string] += 8 ** (window - distance)
+        except (tokenize.TokenError, SyntaxError):
+            pass
+        return counts
+
 
@@ -2,23 +2,28 @@
 
 from oracle import Terminal, Browser
 from debugging_strategy import DebuggingStrategy
-from tracer import Tracer
+from tracer import Tracer, MonitoringTracer
+from scope_filter import ScopeFilter
+from trust_policy import TrustPolicy
+from line_sampler import LineSampler
+from replay import CallRecorder
+from capture_policy import CapturePolicy
 from coverage import Coverage
 from program_repairer import ProgramRepairer
 from pydd_repl import PyDDRepl
 from execution_tree import ExecutionTree
+from tree_compressor import TreeCompressor
+from answer_cache import AnswerCache
 from trace_iterator import TraceIterator
-from dill import Pickler, Unpickler
-import shelve
+from trace_log import TraceWriter, CoverageWriter, TraceReader, CoverageReader
 import os
 import sys
 import argparse
 
-shelve.Pickler = Pickler
-shelve.Unpickler = Unpickler
-
 class PyDD:
-    def __init__(self, source_file, interactive, web, debugging_strategy, program_repair_strategy, args):
+    def __init__(self, source_file, interactive, web, debugging_strategy, program_repair_strategy, args, backend = "settrace", include = "", exclude = "",
+                 capture_limits = (3, 100, 200), trace_mode = "full", compression = "no",
+                 answer_store = "no", trust = "no", jobs = 1):
         self.source_file = source_file
         self.interactive = True if interactive == "yes" else False
         self.web = True if web == "yes" else False
@@ -28,6 +33,26 @@ class PyDD:
         self.queries = []
         self.debugging_strategy = debugging_strategy
         self.program_repair_strategy = program_repair_strategy
+        # processes testing repair candidates in parallel
+        self.jobs = int(jobs)
+        self.backend = backend
+        # the target file is always traced, -inc/-exc add comma-separated module or path globs
+        self.scope = ScopeFilter([source_file, *filter(None, include.split(","))],
+                                 [*filter(None, exclude.split(","))])
+        # calls matching these comma-separated rules are never asked about, see TrustPolicy
+        self.trust = TrustPolicy(trust.split(",")) if trust != "no" else None
+        # max depth, max container length and max string/bytes length of captured values
+        self.policy = CapturePolicy(*map(int, capture_limits))
+        try:
+            self.sampler = LineSampler.parse(trace_mode)
+        except ValueError as e:
+            sys.exit(str(e))
+        # record-light runs keep each call's arguments instead of its line events
+        self.recorder = CallRecorder() if self.sampler.mode == "light" else None
+        # no, subtrees (one question per class of identical calls), recursion (fold direct recursion) or all
+        self.compression = compression
+        # verdicts kept between sessions, "no" asks every question again
+        self.answer_store = answer_store
         self.cov = Coverage()
     
     def __enter__(self):
@@ -45,9 +70,9 @@ class PyDD:
                 sys_str += ": file exists."
             sys.exit(sys_str)
                     
-        self.trace_file = shelve.open(trace_file, writeback=True)
-        self.cov_file = shelve.open(cov_file, writeback=True)
-        setattr(self.cov, "cov_file", self.cov_file)
+        # events are streamed to disk while tracing and read back per node afterwards
+        self.trace_file = TraceWriter(trace_file)
+        self.cov_file = CoverageWriter(cov_file)
         return self
         
     def __exit__(self, exc_type, exc_value, exc_traceback):
@@ -61,15 +86,30 @@ class PyDD:
     def run(self):
         if not self.exists(self.source_file):
             sys.exit(f'{self.source_file}: not found.')
+        if self.backend == "monitoring" and not hasattr(sys, "monitoring"):
+            sys.exit(f'{self.backend}: backend requires Python 3.12 or later.')
         self.exec_file()
+        trace_file, cov_file = self._args
+        self.trace_file.close()
+        self.cov_file.close()
+        self.trace_file = TraceReader(trace_file, self.trace_file.sources)
+        self.cov_file = CoverageReader(cov_file)
+        setattr(self.cov, "cov_file", self.cov_file)
             
     def exists(self, file):
         return os.path.isfile(file)
 
+    def make_tracer(self):
+        if self.backend == "monitoring":
+            return MonitoringTracer(self.exec_tree, self.trace_file, self.cov_file, self.scope, self.policy,
+                                    self.sampler, self.recorder, self.trust)
+        return Tracer(self.exec_tree, self.trace_file, self.cov_file, self.scope, self.policy, self.sampler,
+                      self.recorder, self.trust)
+
     def exec_file(self, globals = None, locals = None):
         with open(self.source_file, "rb") as f:
             src_code = compile(f.read(), self.source_file, "exec")
-            with Tracer(self.exec_tree, self.trace_file, self.cov_file):
+            with self.make_tracer():
                 if not globals:
                     globals = {
                         "__file__": self.source_file,
@@ -93,23 +133,59 @@ class PyDD:
         else:
             oracle = Terminal(self.queries)
             tree_printer = ExecutionTree.to_ascii
+        if self.trust:
+            dropped = self.exec_tree.drop_trusted()
+            if not self.web:
+                print(f"{dropped} trusted calls left out of the search.")
+        compressor = self.compress() if self.compression != "no" else None
+        cache = AnswerCache(self.answer_store) if self.answer_store != "no" else None
+        answers = [source for source in (compressor, cache) if source is not None]
         strategy = self.debugging_strategy.replace("-", "_")
         strategy_dispatcher = getattr(DebuggingStrategy(
                                         self.exec_tree,
                                         self.interactive, 
                                         self.start_repl,
                                         oracle,
-                                        tree_printer), 
+                                        tree_printer,
+                                        answers), 
                                       strategy)
-        if strategy_dispatcher:
-            strategy_dispatcher()
+        try:
+            if strategy_dispatcher:
+                strategy_dispatcher()
+        finally:
+            if cache:
+                cache.save()
+        if not self.web:
+            if compressor:
+                print(f"{compressor.auto_answered} questions answered from equivalent calls.")
+            if cache:
+                print(f"{cache.auto_answered} questions answered from earlier sessions ({self.answer_store}).")
+
+    def compress(self):
+        compressor = TreeCompressor(self.exec_tree)
+        if self.compression in ("recursion", "all"):
+            compressor.collapse_recursion()
+        if self.compression in ("subtrees", "all"):
+            compressor.share_subtrees()
+        if not self.web:
+            print(f"{compressor.collapsed} recursive calls folded into their callers, "
+                  f"{compressor.shared} calls share the answer of an identical call.")
+        return compressor
     
     def start_repl(self, node):
         if node.id == 0:
             return # skip virtual root
-        execution_trace = self.trace_file[str(node.id)]
+        execution_trace = self.trace_file.get(str(node.id))
+        cov = self.cov
+        if not execution_trace and self.recorder and self.recorder.can_replay(node):
+            PyDDRepl.console.print(f"[gray]Re-executing {node} to rebuild its trace.[/gray]")
+            execution_trace, executed = self.recorder.replay(node, self.scope, self.policy)
+            cov = Coverage({str(node.id) : executed})
+        if not execution_trace:
+            PyDDRepl.console.print(f"[yellow]No line events were recorded for {node} (trace mode {self.sampler}).[/yellow]")
+            return
         tracer = TraceIterator(execution_trace)
-        pydd_repl = PyDDRepl(node, tracer, self.program_repair_strategy, self.cov)
+        pydd_repl = PyDDRepl(node, tracer, self.program_repair_strategy, cov, self.jobs)
         pydd_repl.cmdloop(intro = None)
 
 
@@ -117,9 +193,15 @@ if __name__ == "__main__":
     if sys.argv:
         _, args = sys.argv
         args = args.split()
-        args = list(filter(lambda arg: arg[0] % 2 != 0, enumerate(args)))
-        args = list(map(lambda e: e[1], args))
-        f, i, w, d, pr, t, c = args
-        with PyDD(f, i, w, d, pr, (t, c)) as debugger:
+        opts = dict(zip(args[::2], args[1::2]))
+        f, i, w, d, pr, t, c, b = (opts[opt] for opt in ("-f", "-i", "-w", "-d", "-pr", "-t", "-c", "-b"))
+        inc, exc = opts.get("-inc", ""), opts.get("-exc", "")
+        limits = (opts["-cd"], opts["-cl"], opts["-cs"])
+        m = opts.get("-m", "full")
+        z = opts.get("-z", "no")
+        a = opts.get("-a", "no")
+        trust = opts.get("-trust", "no")
+        j = opts.get("-j", "1")
+        with PyDD(f, i, w, d, pr, (t, c), b, inc, exc, limits, m, z, a, trust, j) as debugger:
             debugger.run()
             debugger.start_debugging()
\ No newline at end of file
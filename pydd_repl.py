@@ -17,18 +17,22 @@ class PyDDRepl(cmd.Cmd):
     prompt = "(PyDD) "   
     console = Console(log_time = False)
         
-    def __init__(self, node, tracer, repair_strategy, cov):
+    def __init__(self, node, tracer, repair_strategy, cov, jobs = 1):
         super().__init__()  
         self.node = node
         self.tracer = tracer
         self.breakpoints = []
         self.watchpoints = {}
+        self.locals_tables = {}
         self.repair_strategy = repair_strategy
         self.cov = cov
+        self.jobs = jobs
 
     def preloop(self):
         if os.path.exists(history):
             readline.read_history_file(history)
+        if self.node.partial:
+            self.console.print(f"[yellow]Partial trace: {len(self.tracer)} line events of this call were recorded.[/yellow]")
 
     def postloop(self):
         readline.set_history_length(history_length)
@@ -154,22 +158,28 @@ class PyDDRepl(cmd.Cmd):
  
             starting_lineno = list(self.node.source.keys())[0]
             fault_lineno = int(fault_lineno) - int(starting_lineno) + 1
-            program_repairer = ProgramRepairer(f_name, source, fault_lineno, ret_val, sem_specs)
+            program_repairer = ProgramRepairer(f_name, source, fault_lineno, ret_val, sem_specs, self.jobs)
             program_repairer.repair(self.repair_strategy)
         else:
             self.help_repair()
         
     def _get_locals_table(self, *args):
         line_no = self.tracer.curr().lineno
+        key = (line_no, args)
+        if key in self.locals_tables:
+            return self.locals_tables[key]
         locals_table = {}
-        for event_record in self.tracer.trace:
-            if event_record.lineno > line_no: 
+        for index in range(len(self.tracer)):
+            lineno = self.tracer.lineno(index)
+            if lineno > line_no: 
                 break
-            event_locals = event_record.locals_table(*args)
-            lineno = event_record.lineno
+            # only the first event recorded on a line is shown, later ones are never decoded
+            if lineno in locals_table or not self.tracer.has_locals(index):
+                continue
+            event_locals = self.tracer.trace[index].locals_table(*args)
             if event_locals:
-                if lineno not in locals_table:
-                    locals_table[lineno] = event_locals                
+                locals_table[lineno] = event_locals                
+        self.locals_tables[key] = locals_table
         return locals_table
     
     def _set_watchpoints(self, *args):
@@ -0,0 +1,71 @@
+from execution_tree import ExecutionTree
+from event import EventBuffer
+from tracer import Tracer
+import inspect
+import pickle
+import dill
+
+# generators and coroutines are traced as one node per resumption, which a plain call cannot reproduce
+UNREPLAYABLE = inspect.CO_GENERATOR | inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR
+
+class CoverageBuffer(dict):
+    def append(self, node_id, lineno):
+        self.setdefault(node_id, []).append(lineno)
+
+
+class CallRecorder:
+    """ Keeps the function and a pickled copy of the arguments of each traced call, so that
+    a record-light run can rebuild the line trace of a node by calling it again """
+    def __init__(self):
+        self.calls = {}
+        self.failed = 0
+
+    def record(self, node_id, frame, func):
+        if func is None or frame.f_code.co_flags & UNREPLAYABLE:
+            return
+        # copied at call time, the callee may still mutate its arguments
+        arguments = self.get_arguments(frame)
+        for dumps in (pickle.dumps, dill.dumps):
+            try:
+                self.calls[node_id] = (func, dumps(arguments))
+                return
+            except Exception:
+                pass
+        self.failed += 1
+
+    def get_arguments(self, frame):
+        co = frame.f_code
+        f_locals = frame.f_locals
+        names = co.co_varnames
+        n_args, n_kwonly = co.co_argcount, co.co_kwonlyargcount
+        args = [f_locals[name] for name in names[:n_args]]
+        kwargs = {name : f_locals[name] for name in names[n_args:n_args + n_kwonly]}
+        i = n_args + n_kwonly
+        if co.co_flags & inspect.CO_VARARGS:
+            args.extend(f_locals[names[i]])
+            i += 1
+        if co.co_flags & inspect.CO_VARKEYWORDS:
+            kwargs.update(f_locals[names[i]])
+        return args, kwargs
+
+    def can_replay(self, node):
+        return node.id in self.calls
+
+    def replay(self, node, scope = None, policy = None):
+        """ Calls the function of node again with its recorded arguments under full line tracing,
+        returns its events and executed lines. Globals and closed-over variables are read as they
+        are now, so the trace matches the recorded call only if those did not change since. """
+        func, blob = self.calls[node.id]
+        args, kwargs = dill.loads(blob)
+        exec_tree = ExecutionTree()
+        events = EventBuffer()
+        coverage = CoverageBuffer()
+        with Tracer(exec_tree, events, coverage, scope, policy):
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                pass # the recorded call may have raised too
+        root = exec_tree.root
+        if not root:
+            return [], []
+        return events.get(root.id, []), coverage.get(root.id, [])
@@ -0,0 +1,35 @@
+from fnmatch import fnmatch
+import os
+
+class ScopeFilter:
+    def __init__(self, include = (), exclude = ()):
+        self.include = [self.normalise(pattern) for pattern in include]
+        self.exclude = [self.normalise(pattern) for pattern in exclude]
+        self.cache = {}
+    
+    @classmethod
+    def normalise(cls, pattern):
+        # path globs are matched against absolute file names, anything else against module names.
+        # A glob that starts with a wildcard ("*/site-packages/*") already matches anywhere.
+        if pattern.startswith(("*", "?", "[")):
+            return pattern
+        if os.sep in pattern or pattern.endswith(".py"):
+            return os.path.abspath(os.path.expanduser(pattern))
+        return pattern
+    
+    def matches(self, patterns, module_name, file_name):
+        return any(fnmatch(module_name, pattern) or fnmatch(file_name, pattern)
+                   for pattern in patterns)
+    
+    def in_scope(self, frame):
+        co = frame.f_code
+        try:
+            return self.cache[co]
+        except KeyError:
+            pass
+        module_name = frame.f_globals.get("__name__", "")
+        file_name = os.path.abspath(co.co_filename)
+        result = (not self.include or self.matches(self.include, module_name, file_name)) and \
+            not self.matches(self.exclude, module_name, file_name)
+        self.cache[co] = result
+        return result
@@ -0,0 +1,178 @@
+from itertools import islice
+import operator
+
+class Snapshot:
+    """ Captured container value, materialised only when it is displayed or compared.
+    Subclasses rebuild the value from the history in materialise(). """
+    __slots__ = ("history", "length")
+
+    def __init__(self, history, length):
+        self.history = history
+        self.length = length
+
+    def is_tip(self):
+        return self.length == len(self.history)
+
+    def __len__(self):
+        return len(self.materialise())
+
+    def __iter__(self):
+        return iter(self.materialise())
+
+    def __getitem__(self, key):
+        return self.materialise()[key]
+
+    def __eq__(self, other):
+        if isinstance(other, Snapshot):
+            if self.history is other.history:
+                # versions of the same history only grow when the value changed
+                return self.length == other.length
+            other = other.materialise()
+        return self.materialise() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.materialise())
+
+
+class ListSnapshot(Snapshot):
+    __slots__ = ()
+
+    def materialise(self):
+        return self.history[:self.length]
+
+    def __eq__(self, other):
+        if isinstance(other, list) and self.is_tip():
+            return self.history == other
+        return super().__eq__(other)
+
+    __hash__ = None
+
+
+class Deleted:
+    def __reduce__(self):
+        return "DELETED"
+
+    def __repr__(self):
+        return "<deleted>"
+
+DELETED = Deleted()
+
+
+class DictHistory(list):
+    """ Append-only log of (key, value) writes plus the state at its tip """
+    __slots__ = ("state",)
+
+    def __init__(self, state):
+        super().__init__(state.items())
+        self.state = state.copy()
+
+    @classmethod
+    def from_log(cls, entries):
+        history = cls({})
+        history.extend(entries)
+        for key, value in entries:
+            if value is DELETED:
+                history.state.pop(key, None)
+            else:
+                history.state[key] = value
+        return history
+
+
+class DictSnapshot(Snapshot):
+    __slots__ = ()
+
+    def materialise(self):
+        if self.is_tip():
+            return self.history.state.copy()
+        d = {}
+        for key, value in islice(self.history, self.length):
+            if value is DELETED:
+                d.pop(key, None)
+            else:
+                d[key] = value
+        return d
+
+    def __eq__(self, other):
+        if isinstance(other, dict) and self.is_tip():
+            return self.history.state == other
+        return super().__eq__(other)
+
+    __hash__ = None
+
+
+class SnapshotStore:
+    """ Captures successive versions of the same list/dict binding as deltas
+    on a shared history, so a container mutated n times costs O(n) memory. """
+    def __init__(self):
+        self.shared = 0
+        self.copied = 0
+
+    def capture(self, value, previous = None, accepts = None):
+        """ accepts(values) is asked about the values a list/dict snapshot adds to its history
+        (all of them for a first snapshot), None is returned if they are not accepted or if the
+        value cannot share the history of its previous snapshot """
+        if type(value) is list:
+            return self.capture_list(value, previous, accepts)
+        if type(value) is dict:
+            return self.capture_dict(value, previous, accepts)
+        return value.copy()
+
+    def capture_list(self, value, previous, accepts = None):
+        if isinstance(previous, ListSnapshot) and previous.is_tip():
+            history = previous.history
+            length = previous.length
+            if len(value) >= length and self.equals(value[:length], history):
+                added = value[length:]
+                if accepts and not accepts(added):
+                    return None
+                history.extend(added)
+                self.shared += 1
+                return ListSnapshot(history, len(value))
+        if accepts and (previous is not None or not accepts(value)):
+            return None
+        self.copied += 1
+        return ListSnapshot(list(value), len(value))
+
+    def equals(self, a, b, op = operator.eq):
+        try:
+            return bool(op(a, b))
+        except Exception:
+            return False
+
+    def capture_dict(self, value, previous, accepts = None):
+        if isinstance(previous, DictSnapshot) and previous.is_tip():
+            history = previous.history
+            state = history.state
+            if len(value) >= len(state) and self.equals(state.items(), value.items(), operator.le):
+                # common case: existing items untouched, new keys inserted at the end
+                added = dict(islice(value.items(), len(state), None))
+                if added.keys().isdisjoint(state.keys()):
+                    if accepts and not accepts(added.values()):
+                        return None
+                    history.extend(added.items())
+                    state.update(added)
+                    self.shared += 1
+                    return DictSnapshot(history, len(history))
+            try:
+                changed = [key for key, val in value.items()
+                           if key not in state or not (state[key] is val or state[key] == val)]
+            except Exception:
+                changed = [key for key, val in value.items() if key not in state or state[key] is not val]
+            if accepts and not accepts([value[key] for key in changed]):
+                return None
+            for key in [key for key in state if key not in value]:
+                history.append((key, DELETED))
+                del state[key]
+            for key in changed:
+                history.append((key, value[key]))
+                state[key] = value[key]
+            # the changed keys are logged as writes, the history is still shared
+            self.shared += 1
+            return DictSnapshot(history, len(history))
+        if accepts and (previous is not None or not accepts(value.values())):
+            return None
+        self.copied += 1
+        history = DictHistory(value)
+        return DictSnapshot(history, len(history))
@@ -23,7 +23,26 @@ class TraceIterator:
         except IndexError:
             raise StopIteration
         return result
+
+    def seek(self, index):
+        if not 0 <= index < len(self.trace):
+            raise StopIteration
+        self.index = index
+        return self.trace[self.index]
+
+    def lineno(self, index):
+        # the trace log can answer this without decoding the event's locals
+        if hasattr(self.trace, "lineno"):
+            return self.trace.lineno(index)
+        return self.trace[index].lineno
+
+    def has_locals(self, index):
+        if hasattr(self.trace, "has_locals"):
+            return self.trace.has_locals(index)
+        return bool(self.trace[index].locals)
+
+    def __len__(self):
+        return len(self.trace)
         
     def __iter__(self):
         return self
-    
\ No newline at end of file
@@ -0,0 +1,356 @@
+from event import Event
+from snapshot import Snapshot, ListSnapshot, DictSnapshot, DictHistory
+from capture_policy import Truncated
+from array import array
+import pickle
+import mmap
+import struct
+import time
+import dill
+import io
+
+# Append-only binary log. Every record is framed as
+#   varint(len(kind + body)) kind body
+# and the file ends with an index record followed by its 8-byte offset.
+#
+#   E  event: node id, lineno, timestamp (ns since the header's base), pickled locals
+#   H  items appended to a snapshot history since it was last written
+#   C  coverage: node id, lineno
+#   X  index: per-node record offsets and history record offsets
+#
+# Source lines are not stored, events resolve them from their node's source map.
+
+MAGIC = b"PYDDLOG2"
+EVENT, HISTORY, COVERAGE, INDEX = b"E", b"H", b"C", b"X"
+LIST_HISTORY, DICT_HISTORY = 0, 1
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+def encode_offsets(offsets, out):
+    encode_varint(len(offsets), out)
+    last = 0
+    for offset in offsets:
+        encode_varint(offset - last, out)
+        last = offset
+
+def decode_offsets(buf, pos):
+    count, pos = decode_varint(buf, pos)
+    offsets = array("Q")
+    last = 0
+    for _ in range(count):
+        delta, pos = decode_varint(buf, pos)
+        last += delta
+        offsets.append(last)
+    return offsets, pos
+
+
+class LogWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.base = time.monotonic_ns()
+        header = MAGIC + struct.pack("<q", self.base)
+        self.file.write(header)
+        self.offset = len(header)
+        self.index = {}
+
+    def write_record(self, kind, body):
+        header = bytearray()
+        encode_varint(len(body) + 1, header)
+        header += kind
+        offset = self.offset
+        self.file.write(header)
+        self.file.write(body)
+        self.offset += len(header) + len(body)
+        return offset
+
+    def index_record(self, node_id, offset):
+        try:
+            self.index[node_id].append(offset)
+        except KeyError:
+            self.index[node_id] = array("Q", (offset,))
+
+    def encode_index(self, out):
+        encode_varint(len(self.index), out)
+        for node_id, offsets in self.index.items():
+            encode_varint(node_id, out)
+            encode_offsets(offsets, out)
+
+    def close(self):
+        if self.file.closed:
+            return
+        body = bytearray()
+        self.encode_index(body)
+        offset = self.write_record(INDEX, body)
+        self.file.write(struct.pack("<Q", offset))
+        self.file.close()
+
+
+class CoverageWriter(LogWriter):
+    def append(self, node_id, lineno):
+        body = bytearray()
+        encode_varint(node_id, body)
+        encode_varint(lineno, body)
+        self.index_record(node_id, self.write_record(COVERAGE, body))
+
+
+class LocalsPickler(pickle.Pickler):
+    def __init__(self, file, writer):
+        super().__init__(file, protocol = pickle.HIGHEST_PROTOCOL)
+        self.writer = writer
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Snapshot):
+            return self.writer.snapshot_id(obj)
+
+
+class LocalsDillPickler(dill.Pickler):
+    def __init__(self, file, writer):
+        super().__init__(file, protocol = pickle.HIGHEST_PROTOCOL)
+        self.writer = writer
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Snapshot):
+            return self.writer.snapshot_id(obj)
+
+
+class TraceWriter(LogWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.histories = {}
+        self.history_offsets = {}
+        self.sources = {}
+
+    def append(self, node_id, event):
+        if node_id not in self.sources:
+            self.sources[node_id] = event.source
+        body = bytearray()
+        encode_varint(node_id, body)
+        encode_varint(event.lineno, body)
+        encode_varint(zigzag(event.timestamp - self.base), body)
+        if event.locals:
+            body += self.dump(event.locals)
+        self.index_record(node_id, self.write_record(EVENT, body))
+
+    def dump(self, obj):
+        for pickler in (LocalsPickler, LocalsDillPickler):
+            buf = io.BytesIO()
+            try:
+                pickler(buf, self).dump(obj)
+                return buf.getvalue()
+            except Exception:
+                pass
+        # keep the names that could not be pickled, not their values
+        return self.dump({name : Truncated(type(value).__name__, None, detail = "(not picklable)")
+                          for name, value in obj.items()})
+
+    def snapshot_id(self, snapshot):
+        # flush the part of the history that has not been written yet, events only reference it
+        history = snapshot.history
+        try:
+            history_id, written, _ = self.histories[id(history)]
+        except KeyError:
+            history_id, written = len(self.histories), 0
+        if len(history) > written:
+            body = bytearray()
+            encode_varint(history_id, body)
+            body += self.dump(history[written:])
+            self.history_offsets.setdefault(history_id, array("Q")).append(self.write_record(HISTORY, body))
+        self.histories[id(history)] = (history_id, len(history), history)
+        kind = DICT_HISTORY if isinstance(snapshot, DictSnapshot) else LIST_HISTORY
+        return (kind, history_id, snapshot.length)
+
+    def encode_index(self, out):
+        super().encode_index(out)
+        encode_varint(len(self.history_offsets), out)
+        for history_id, offsets in self.history_offsets.items():
+            encode_varint(history_id, out)
+            encode_offsets(offsets, out)
+
+
+class LogReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        # records are sliced straight out of the mapping, the file is never read as a whole
+        self.buf = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        if self.buf[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a PyDD trace log.")
+        self.base, = struct.unpack_from("<q", self.buf, len(MAGIC))
+        index_offset, = struct.unpack_from("<Q", self.buf, len(self.buf) - 8)
+        _, body = self.read_record(index_offset)
+        self.decode_index(body, 0)
+
+    def read_record(self, offset):
+        length, pos = decode_varint(self.buf, offset)
+        return self.buf[pos:pos + 1], self.buf[pos + 1:pos + length]
+
+    def body_offset(self, offset):
+        # position of the first byte after the kind of the record at offset
+        _, pos = decode_varint(self.buf, offset)
+        return pos + 1
+
+    def decode_index(self, buf, pos):
+        self.index = {}
+        count, pos = decode_varint(buf, pos)
+        for _ in range(count):
+            node_id, pos = decode_varint(buf, pos)
+            self.index[node_id], pos = decode_offsets(buf, pos)
+        return pos
+
+    def keys(self):
+        return [str(node_id) for node_id in self.index]
+
+    def items(self):
+        return [(str(node_id), self[node_id]) for node_id in self.index]
+
+    def get(self, node_id, default = None):
+        if node_id in self:
+            return self[node_id]
+        return default
+
+    def __contains__(self, node_id):
+        return int(node_id) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        if not self.buf.closed:
+            self.buf.close()
+        self.file.close()
+
+
+class CoverageReader(LogReader):
+    def __getitem__(self, node_id):
+        lines = []
+        for offset in self.index[int(node_id)]:
+            _, body = self.read_record(offset)
+            _, pos = decode_varint(body, 0)
+            lineno, _ = decode_varint(body, pos)
+            lines.append(lineno)
+        return lines
+
+
+class LocalsUnpickler(pickle.Unpickler):
+    def __init__(self, file, reader):
+        super().__init__(file)
+        self.reader = reader
+
+    def persistent_load(self, pid):
+        kind, history_id, length = pid
+        history = self.reader.history(kind, history_id)
+        if kind == DICT_HISTORY:
+            return DictSnapshot(history, length)
+        return ListSnapshot(history, length)
+
+
+class TraceReader(LogReader):
+    def __init__(self, path, sources = None):
+        self.sources = sources or {}
+        self.histories = {}
+        super().__init__(path)
+
+    def decode_index(self, buf, pos):
+        pos = super().decode_index(buf, pos)
+        self.history_offsets = {}
+        count, pos = decode_varint(buf, pos)
+        for _ in range(count):
+            history_id, pos = decode_varint(buf, pos)
+            self.history_offsets[history_id], pos = decode_offsets(buf, pos)
+        return pos
+
+    def load(self, data):
+        return LocalsUnpickler(io.BytesIO(data), self).load()
+
+    def history(self, kind, history_id):
+        try:
+            return self.histories[history_id]
+        except KeyError:
+            pass
+        items = []
+        for offset in self.history_offsets.get(history_id, ()):
+            _, body = self.read_record(offset)
+            _, pos = decode_varint(body, 0)
+            items.extend(self.load(body[pos:]))
+        history = DictHistory.from_log(items) if kind == DICT_HISTORY else items
+        self.histories[history_id] = history
+        return history
+
+    def read_lineno(self, offset):
+        _, pos = decode_varint(self.buf, self.body_offset(offset))
+        lineno, _ = decode_varint(self.buf, pos)
+        return lineno
+
+    def has_locals(self, offset):
+        length, pos = decode_varint(self.buf, offset)
+        end = pos + length
+        pos += 1
+        for _ in range(3):
+            _, pos = decode_varint(self.buf, pos)
+        return pos < end
+
+    def read_event(self, offset):
+        _, body = self.read_record(offset)
+        node_id, pos = decode_varint(body, 0)
+        lineno, pos = decode_varint(body, pos)
+        timestamp, pos = decode_varint(body, pos)
+        f_locals = self.load(body[pos:]) if pos < len(body) else {}
+        return Event(node_id, lineno, self.base + unzigzag(timestamp), f_locals, self.sources.get(node_id))
+
+    def __getitem__(self, node_id):
+        return EventView(self, self.index[int(node_id)])
+
+
+class EventView:
+    """ Random-access sequence over the events of one node, decoded on access """
+    def __init__(self, reader, offsets):
+        self.reader = reader
+        self.offsets = offsets
+        self.cached = (None, None)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event index out of range")
+        cached_index, event = self.cached
+        if cached_index != index:
+            event = self.reader.read_event(self.offsets[index])
+            self.cached = (index, event)
+        return event
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def lineno(self, index):
+        return self.reader.read_lineno(self.offsets[index])
+
+    def has_locals(self, index):
+        return self.reader.has_locals(self.offsets[index])
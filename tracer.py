@@ -1,22 +1,41 @@
-from etnode import ETNode
 from event import Event
-from datetime import datetime
+from etnode import ETNode
+from code_cache import CodeCache
+from locals_tracker import LocalsTracker
+from snapshot import SnapshotStore
+from capture_policy import CapturePolicy, Truncated
+from line_sampler import LineSampler
 import sys
 import os
 import inspect
-import gc
+import time
+import weakref
+import dis
+
+# a frame that returns normally stops on one of these, one that unwinds stops where it raised
+RETURN_OPCODES = {op for name, op in dis.opmap.items()
+                  if name.replace("INSTRUMENTED_", "") in ("RETURN_VALUE", "RETURN_CONST", "YIELD_VALUE")}
 
   
 class Tracer:
-    def __init__(self, exec_tree, trace_file, cov_file):
+    def __init__(self, exec_tree, trace_file, cov_file, scope = None, policy = None, sampler = None, recorder = None,
+                 trust = None):
         self.exec_tree = exec_tree
         self.default_tracer = sys.gettrace()
         self.current_node = None
-        self.source = []
+        self.code_cache = CodeCache(self.get_signature)
+        self.nested_sigs = weakref.WeakKeyDictionary()
         self.stack_level = 0
-        self.last_vars = {}
+        self.locals_tracker = LocalsTracker()
+        self.snapshots = SnapshotStore()
+        self.policy = policy or CapturePolicy()
+        self.sampler = sampler or LineSampler()
+        self.recorder = recorder
         self.trace_file = trace_file
         self.cov_file = cov_file
+        self.scope = scope
+        self.trust = trust
+        self.raised = {}
                                
     def excepthook(self, exc_type, exc_value, exc_tb):
         exc_type_name = exc_type.__name__
@@ -26,79 +45,138 @@ class Tracer:
         sys.__excepthook__(exc_type, exc_value, exc_tb)
     
     def track_event(self, node_id, event_record):
-        self.trace_file.setdefault(node_id, []).append(event_record)    
+        self.trace_file.append(node_id, event_record)
     
     def track_cov(self, node_id, lineno):
-        self.cov_file.setdefault(node_id, []).append(lineno)
+        self.cov_file.append(node_id, lineno)
     
     def __call__(self, frame, event, arg):
-        package_name = frame.f_globals["__name__"].split('.')[0]        
-
-        co = frame.f_code 
-        f_name = co.co_name 
-        f_params = frame.f_locals
-        line_no = frame.f_lineno
-        file_name = co.co_filename
-        f_globals = frame.f_globals
-        co_names = co.co_names
-        co_freevars = co.co_freevars
-
-        if f_name == "<module>":
-            self.source = inspect.getsource(frame).split("\n")
-        
+        if event == "call":
+            if self.scope and not self.scope.in_scope(frame):
+                return
+            return self.trace_call(frame)
+        elif event == "line":
+            self.trace_line(frame)
+            return self
+        elif event == "exception":
+            self.trace_exception(arg)
+        elif event == "return":
+            self.trace_return(event, arg, frame)
+    
+    def get_name(self, frame):
+        f_name = frame.f_code.co_name
         if "self" in frame.f_locals:
             obj = frame.f_locals["self"]
             class_name = obj.__class__.__name__
             f_name = class_name + '.' + frame.f_code.co_name
             if class_name == self.__class__.__name__:
                 return
-                                                           
-        sanitised_params = self.sanitise_params(f_name, f_params,f_globals, co_names, co_freevars)
-                       
-        parent_frame = frame.f_back
-        parent_name = parent_frame.f_code.co_name if parent_frame else ""
+        return f_name
+    
+    def trace_call(self, frame):
+        f_name = self.get_name(frame)
+        if not f_name:
+            return
+        line_no = frame.f_lineno
+        code_info = self.code_cache.lookup(frame)
+        trusted = self.trust is not None and self.trust.trusts(frame, code_info)
+        if trusted:
+            params = {}
+        else:
+            bindings = self.get_bindings(f_name, frame)
+            params = self.locals_tracker.start(self.stack_level, bindings, self.get_snapshot(frame))
+
+        next_node = self.exec_tree.insert(self.current_node, f_name, self.call_signature(frame, code_info), params,
+                                          code_info.source, qualname = code_info.qualname)
+        self.current_node = next_node
+        self.stack_level += 1
+        if trusted:
+            # kept only as the caller of what it calls back, nothing of its own is recorded
+            next_node.state = ETNode.State.TRUSTED
+            frame.f_trace_lines = False
+            return self
         
-        updated_locals = self.track_locals(event, line_no, sanitised_params)        
-        self.last_vars = sanitised_params.copy()
-
-        if event == "line":
-            current_line = self.source[line_no - 1]
-            if updated_locals[line_no]:
-                self.current_node.update(updated_locals)
-
-            now = datetime.now()
-            timestamp = datetime.timestamp(now)
-            updated_locals = updated_locals[line_no] if updated_locals else {}
-            event_record = Event(timestamp, event, line_no, current_line, updated_locals)
-            
-            if self.current_node:
-                self.track_event(str(self.current_node.id), event_record)
-                self.track_cov(str(self.current_node.id), line_no)
-                # updated m_params
-                for var, value in self.last_vars.items():
-                    if var in self.current_node.params:
-                        self.current_node.m_params[var] = value
-            
-        if event == "call":
-            source_lines, starting_lineno = inspect.getsourcelines(frame)
-            source = {starting_lineno + i: line for i, line in enumerate(source_lines)} 
-            params = sanitised_params.copy()
-            f_sig = self.get_signature(co)
-            next_node = ETNode(self.stack_level, f_name, f_sig or "", params, source)
-            self.exec_tree.insert_at(self.current_node, next_node)            
-            self.current_node = next_node
-            self.stack_level += 1
-            
-            self.track_cov(str(self.current_node.id), line_no)
+        if self.recorder:
+            self.recorder.record(next_node.id, frame, self.get_function(frame))
+        if self.sampler.bounded:
+            self.sampler.start(next_node)
+            if not self.sampler.lines_enabled():
+                frame.f_trace_lines = False
+            self.sampler.covers(next_node.id, line_no)
+        self.track_cov(self.current_node.id, line_no)
+        return self
+    
+    def trace_line(self, frame):
+        f_name = self.get_name(frame)
+        if not f_name:
+            return
+        line_no = frame.f_lineno
+        if self.sampler.bounded:
+            if self.sampler.covers(self.current_node.id, line_no):
+                self.track_cov(self.current_node.id, line_no)
+            if self.sampler.skip(self.current_node):
+                self.trace_params(frame)
+                return
+        bindings = self.get_bindings(f_name, frame)
+        # only bindings that were rebound or mutated since the last event are snapshotted
+        updated_locals = self.locals_tracker.diff(self.current_node.id, bindings, self.get_snapshot(frame))
+        if self.sampler.held:
+            held = self.sampler.release(self.current_node)
+            if held:
+                updated_locals = {**held, **updated_locals}
+
+        if updated_locals:
+            self.current_node.update({line_no : updated_locals})
+            # updated m_params
+            for var, value in updated_locals.items():
+                if var in self.current_node.params:
+                    self.current_node.m_params[var] = value
+
+        event_record = Event(self.current_node.id, line_no, time.monotonic_ns(), updated_locals, self.current_node.source)
         
-        elif event == "return" or event == "exception":
-            if self.current_node:
-                if event == "exception":
-                    arg = f"{str(arg[0].__name__)} : {arg[1]}"
-                self.current_node.result = arg
-                self.current_node = self.current_node.parent
+        if self.sampler.bounded:
+            if self.sampler.admit(self.current_node, event_record):
+                self.track_event(self.current_node.id, event_record)
             return
-        return self
+        self.track_event(self.current_node.id, event_record)
+        self.track_cov(self.current_node.id, line_no)
+    
+    def trace_params(self, frame):
+        # the event of a dropped line is not recorded, the modified parameters still are
+        node = self.current_node
+        f_locals = frame.f_locals
+        bindings = {name : f_locals[name] for name in node.params if name in f_locals}
+        changed = self.locals_tracker.diff(node.id, bindings, self.get_snapshot(frame))
+        if changed:
+            node.m_params.update(changed)
+            self.sampler.hold(node, changed)
+
+    def trace_exception(self, arg):
+        # the exception may still be handled in this frame, it only becomes the
+        # result if the frame exits through it
+        if self.current_node:
+            self.raised[self.current_node.id] = arg
+
+    def unwinding(self, frame):
+        # decided from the instruction the frame stopped on, so it does not depend on line events
+        if frame is None:
+            return True
+        return frame.f_code.co_code[frame.f_lasti] not in RETURN_OPCODES
+
+    def trace_return(self, event, arg, frame = None):
+        if self.current_node:
+            raised = self.raised.pop(self.current_node.id, None) if self.raised else None
+            if raised and arg is None and self.unwinding(frame):
+                event, arg = "exception", raised
+            if event == "exception":
+                arg = f"{str(arg[0].__name__)} : {arg[1]}"
+            self.current_node.result = self.policy.capture(arg)
+            self.locals_tracker.stop(self.current_node.id)
+            self.exec_tree.close(self.current_node)
+            if self.sampler.bounded:
+                for event_record in self.sampler.flush(self.current_node):
+                    self.track_event(self.current_node.id, event_record)
+            self.current_node = self.current_node.parent
     
     def __enter__(self):
         sys.excepthook = self.excepthook
@@ -109,17 +187,99 @@ class Tracer:
         if exc_type:
             print(exc_type, exc_value, exc_traceback)
             return False       
-        self.current_node = None
+        self.close_open_nodes()
         sys.settrace(self.default_tracer)
         sys.excepthook = sys.__excepthook__
         return True
     
-    def get_signature(self, co):
-        obj = self.get_object(co)
-        if obj:
-            f_sig = inspect.signature(obj)
-            return str(f_sig)
+    def close_open_nodes(self):
+        # calls still running when tracing stops never returned
+        while self.current_node:
+            self.exec_tree.close(self.current_node)
+            self.current_node = self.current_node.parent
+
+    def call_signature(self, frame, code_info):
+        # a def inside a function makes a new function each time it runs, they share one code
+        # object but each has its own defaults
+        if "<locals>" not in code_info.qualname:
+            return code_info.sig
+        func = self.get_function(frame)
+        key = func if func is not None else frame.f_code
+        try:
+            return self.nested_sigs[key]
+        except KeyError:
+            sig = self.nested_sigs[key] = self.render_signature(frame.f_code, func) or ""
+            return sig
+
+    def get_signature(self, frame):
+        co = frame.f_code
+        if not co.co_flags & inspect.CO_OPTIMIZED:
+            # module and class bodies
+            return
+        return self.render_signature(co, self.get_function(frame))
+
+    def render_signature(self, co, func):
+        defaults = getattr(func, "__defaults__", None) or ()
+        kwdefaults = getattr(func, "__kwdefaults__", None) or {}
+        annotations = getattr(func, "__annotations__", None) or {}
+        empty = inspect.Parameter.empty
+        arg_names = co.co_varnames[:co.co_argcount]
+        kwonly_names = co.co_varnames[co.co_argcount:co.co_argcount + co.co_kwonlyargcount]
+        extra_names = iter(co.co_varnames[co.co_argcount + co.co_kwonlyargcount:])
+        first_default = len(arg_names) - len(defaults)
+        params = []
+        for i, name in enumerate(arg_names):
+            kind = inspect.Parameter.POSITIONAL_ONLY if i < co.co_posonlyargcount \
+                else inspect.Parameter.POSITIONAL_OR_KEYWORD
+            default = defaults[i - first_default] if i >= first_default else empty
+            params.append((name, kind, default))
+        if co.co_flags & inspect.CO_VARARGS:
+            params.append((next(extra_names), inspect.Parameter.VAR_POSITIONAL, empty))
+        for name in kwonly_names:
+            params.append((name, inspect.Parameter.KEYWORD_ONLY, kwdefaults.get(name, empty)))
+        if co.co_flags & inspect.CO_VARKEYWORDS:
+            params.append((next(extra_names), inspect.Parameter.VAR_KEYWORD, empty))
+        try:
+            f_sig = inspect.Signature([inspect.Parameter(name, kind, default = default,
+                                                         annotation = annotations.get(name, empty))
+                                       for name, kind, default in params],
+                                      return_annotation = annotations.get("return", empty))
+        except (TypeError, ValueError):
+            return
+        return str(f_sig)
+    
+    def get_function(self, frame):
+        # only look where the function object can be found without scanning the heap:
+        # its qualified name from module globals, the class of self/cls and the calling frame's locals
+        co = frame.f_code
+        candidates = [self.resolve_qualname(frame.f_globals, getattr(co, "co_qualname", co.co_name))]
+        if co.co_argcount and co.co_varnames[0] in ("self", "cls"):
+            obj = frame.f_locals.get(co.co_varnames[0])
+            klass = obj if isinstance(obj, type) else type(obj)
+            candidates.extend(vars(base).get(co.co_name) for base in klass.__mro__)
+        if frame.f_back:
+            f_locals = frame.f_back.f_locals
+            candidates.append(f_locals.get(co.co_name))
+            # a nested function returned to the caller, unless several of its locals run this code
+            found = {id(obj) : obj for obj in f_locals.values() if getattr(obj, "__code__", None) is co}
+            if len(found) == 1:
+                candidates.extend(found.values())
+        for obj in candidates:
+            obj = getattr(obj, "__func__", obj) # unwrap staticmethod/classmethod
+            if getattr(obj, "__code__", None) is co:
+                return obj
                     
+    def resolve_qualname(self, f_globals, qualname):
+        if "<locals>" in qualname:
+            return
+        parts = qualname.split(".")
+        obj = f_globals.get(parts[0])
+        for part in parts[1:]:
+            if not isinstance(obj, type):
+                return
+            obj = vars(obj).get(part)
+        return obj
+    
     def check_str(self, str, start_char, end_char):
         return str.startswith(start_char) and \
                str.endswith(end_char)
@@ -130,11 +290,6 @@ class Tracer:
             return True
         return False
             
-    def get_object(self, co):
-        for obj in gc.get_referrers(co):
-            if hasattr(obj, "__code__") and obj.__code__ is co:
-                return obj
-        
     def get_globals(self, f_globals, co_names):
         global_vars = {}
         for name in co_names:
@@ -143,41 +298,156 @@ class Tracer:
                     global_vars["global " + name] = f_globals[name]
         return global_vars
     
-    def sanitise_params(self, f_name, f_locals, f_globals, co_names, co_freevars):
+    def get_bindings(self, f_name, frame):
+        f_locals = frame.f_locals
+        co = frame.f_code
+        bindings = {}
+        if self.is_class_decl(f_locals, f_name) or f_name == "<module>":
+            return bindings
+        for k, v in list(f_locals.items()):
+            if self.check_str(k, "__", "__"):
+                f_locals.pop(k)
+            elif k in co.co_freevars and not hasattr(v, "__dict__"):
+                bindings["freevar " + k] = v
+            else:
+                bindings[k] = v
+        bindings.update(self.get_globals(frame.f_globals, co.co_names))
+        return bindings
+    
+    def get_snapshot(self, frame):
+        co = frame.f_code
+        def snapshot(name, value, previous):
+            # globals and free variables are recorded by reference
+            if name.startswith(("global ", "freevar ")):
+                return self.policy.capture(value)
+            return self.sanitise_value(value, frame.f_globals, co.co_names, co.co_freevars, previous)
+        return snapshot
+    
+    def sanitise_value(self, v, f_globals, co_names, co_freevars, previous = None, depth = 0, seen = ()):
+        if not depth and type(v) in (list, dict) and len(v) > self.policy.max_length:
+            # a long list/dict of plain values bound to a name is kept whole while its snapshots
+            # share one history, it is bounded by the policy once it cannot
+            snapshot = self.snapshots.capture(v, previous, self.policy.is_plain)
+            if snapshot is not None:
+                return snapshot
+        captured = self.policy.capture(v, depth)
+        if captured is not v:
+            # truncated, summarised or a bounded copy
+            return captured
+        if hasattr(v, "__dict__"):
+            if id(v) in seen:
+                return Truncated(type(v).__name__, None, detail = "(back-reference)")
+            if depth >= self.policy.max_depth:
+                self.policy.truncations += 1
+                return Truncated(type(v).__name__, None, detail = "(max depth)")
+            # the ids of the objects being captured on the way down, a cycle ends at the first repeat
+            seen = (*seen, id(v))
+            d = dict(vars(v))
+            for key, val in list(d.items()):
+                if not hasattr(val, "__dict__"):
+                    d[key] = self.policy.capture(val, depth + 1)
+                elif id(val) in seen:
+                    d[key] = Truncated(type(val).__name__, None, detail = "(back-reference)")
+                elif depth + 1 >= self.policy.max_depth:
+                    self.policy.truncations += 1
+                    d[key] = Truncated(type(val).__name__, None, detail = "(max depth)")
+                else:
+                    nested_dict = dict(vars(val))
+                    d[key] = self.sanitise_params(key, nested_dict, f_globals, co_names, co_freevars,
+                                                  depth + 2, (*seen, id(val)))
+            return d
+        elif hasattr(v, "copy"):
+            # lists and dicts share structure with the previous snapshot of the same binding
+            return self.snapshots.capture(v, previous)
+        return v
+    
+    def sanitise_params(self, f_name, f_locals, f_globals, co_names, co_freevars, depth = 0, seen = ()):
         f_params = {}
         if self.is_class_decl(f_locals, f_name) or f_name == "<module>":
             return f_params
         for k, v in list(f_locals.items()):
             if self.check_str(k, "__", "__"):
                 f_locals.pop(k)
-            elif hasattr(v, "__dict__"):
-                d = dict(vars(v))
-                for key, val in list(d.items()):
-                    if hasattr(val, "__dict__"):
-                        nested_dict = dict(vars(val))
-                        d[key] = self.sanitise_params(key, nested_dict, f_globals, co_names, co_freevars)
-                    else:
-                        d[key] = val
-                f_params[k] = d
-            elif k in co_freevars:
+            elif k in co_freevars and not hasattr(v, "__dict__"):
                 f_params["freevar " + k] = f_locals[k]
-            elif hasattr(v, "copy"):
-                f_params[k] = v.copy()
             else:
-                f_params[k] = v
+                f_params[k] = self.sanitise_value(v, f_globals, co_names, co_freevars, depth = depth, seen = seen)
         global_vars = self.get_globals(f_globals, co_names)
         f_params.update(global_vars)
         return f_params 
 
-    def track_locals(self, event, f_lineno, f_locals):
-        if self.current_node:
-            update = {f_lineno : {}}
-            ptr = update[f_lineno]
-            last_locals = {}
-            last_locals.update(self.current_node.params)
-            for d in self.current_node.locals.values():
-                last_locals.update(d)
-            for k, v in f_locals.items():
-                if k not in last_locals or last_locals[k] != v:
-                    ptr[k] = v
-            return update
\ No newline at end of file
+
+class MonitoringTracer(Tracer):
+    """ sys.monitoring (PEP 669) tracing backend (Python 3.12+) """
+    tool_name = "pydd"
+
+    def __init__(self, exec_tree, trace_file, cov_file, scope = None, policy = None, sampler = None, recorder = None,
+                 trust = None):
+        super().__init__(exec_tree, trace_file, cov_file, scope, policy, sampler, recorder, trust)
+        self.monitoring = sys.monitoring
+        self.tool_id = self.monitoring.DEBUGGER_ID
+        self.traced_codes = set()
+
+    def _callbacks(self):
+        events = self.monitoring.events
+        return {
+            events.PY_START : self.on_start,
+            events.PY_RESUME : self.on_resume,
+            events.LINE : self.on_line,
+            events.PY_RETURN : self.on_return,
+            events.PY_YIELD : self.on_return,
+            events.PY_UNWIND : self.on_unwind,
+        }
+
+    def on_start(self, code, offset):
+        # out-of-scope code objects are disabled after their first call, in-scope
+        # ones get line/return events enabled locally (PY_UNWIND is global only)
+        frame = sys._getframe(1)
+        if self.scope and not self.scope.in_scope(frame):
+            return self.monitoring.DISABLE
+        if code not in self.traced_codes:
+            events = self.monitoring.events
+            local_events = events.PY_RESUME | events.PY_RETURN | events.PY_YIELD
+            trusted = self.trust is not None and self.trust.trusts(frame, self.code_cache.lookup(frame))
+            if self.sampler.lines_enabled() and not trusted:
+                local_events |= events.LINE
+            self.monitoring.set_local_events(self.tool_id, code, local_events)
+            self.traced_codes.add(code)
+        self.trace_call(frame)
+
+    def on_resume(self, code, offset):
+        self.trace_call(sys._getframe(1))
+
+    def on_line(self, code, line_number):
+        self.trace_line(sys._getframe(1))
+
+    def on_return(self, code, offset, retval):
+        self.trace_return("return", retval)
+
+    def on_unwind(self, code, offset, exception):
+        if code in self.traced_codes:
+            self.trace_return("exception", (type(exception), exception, exception.__traceback__))
+
+    def __enter__(self):
+        sys.excepthook = self.excepthook
+        events = self.monitoring.events
+        self.monitoring.use_tool_id(self.tool_id, self.tool_name)
+        for event, callback in self._callbacks().items():
+            self.monitoring.register_callback(self.tool_id, event, callback)
+        self.monitoring.restart_events()
+        self.monitoring.set_events(self.tool_id, events.PY_START | events.PY_UNWIND)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.monitoring.set_events(self.tool_id, 0)
+        for code in self.traced_codes:
+            self.monitoring.set_local_events(self.tool_id, code, 0)
+        for event in self._callbacks():
+            self.monitoring.register_callback(self.tool_id, event, None)
+        self.monitoring.free_tool_id(self.tool_id)
+        if exc_type:
+            print(exc_type, exc_value, exc_traceback)
+            return False
+        self.close_open_nodes()
+        sys.excepthook = sys.__excepthook__
+        return True
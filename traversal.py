@@ -0,0 +1,98 @@
+from collections import deque
+from etnode import ETNode, NONE
+
+# Iterative walks of an ExecutionTree, so that deep recursion or long runs of sibling calls
+# in the traced program never reach the interpreter's recursion limit.
+#
+# The *_ids generators work on node ids and read the tree's arrays directly, the others wrap
+# them and yield ETNode views. A walk only descends below a node if prune is not given or
+# prune(node) returns False; the pruned node itself is still yielded. The tree may be
+# modified below a node after it was yielded, the walk reads its children when it resumes.
+
+def child_ids(tree, node_id):
+    first_child, next_sibling = tree.first_child, tree.next_sibling
+    child_id = first_child[node_id]
+    while child_id != NONE:
+        yield child_id
+        child_id = next_sibling[child_id]
+
+def sibling_ids(tree, node_id):
+    # node_id followed by its right siblings
+    next_sibling = tree.next_sibling
+    while node_id != NONE:
+        yield node_id
+        node_id = next_sibling[node_id]
+
+def preorder_ids(tree, root_id, prune = None):
+    first_child, next_sibling = tree.first_child, tree.next_sibling
+    stack = [root_id]
+    while stack:
+        node_id = stack.pop()
+        while node_id != NONE:
+            yield node_id
+            # the rest of the siblings wait until this subtree is done
+            if node_id != root_id and next_sibling[node_id] != NONE:
+                stack.append(next_sibling[node_id])
+            if prune is not None and prune(node_id):
+                break
+            node_id = first_child[node_id]
+
+def postorder_ids(tree, root_id, prune = None):
+    stack = [root_id]
+    while stack:
+        node_id = stack.pop()
+        if node_id < 0:
+            yield ~node_id
+            continue
+        # visited again as ~node_id once its children are done
+        stack.append(~node_id)
+        if prune is None or not prune(node_id):
+            start = len(stack)
+            stack.extend(child_ids(tree, node_id))
+            stack[start:] = stack[:start - 1:-1]
+
+def breadth_first_ids(tree, root_id, prune = None):
+    queue = deque((root_id,))
+    while queue:
+        node_id = queue.popleft()
+        yield node_id
+        if prune is None or not prune(node_id):
+            queue.extend(child_ids(tree, node_id))
+
+def level_ids(tree, root_id, prune = None):
+    # lists of the ids at each depth, the root's first
+    level = [root_id]
+    while level:
+        yield level
+        level = [child_id for node_id in level if prune is None or not prune(node_id)
+                          for child_id in child_ids(tree, node_id)]
+
+def _prune_ids(tree, prune):
+    if prune is None:
+        return None
+    return lambda node_id : prune(ETNode(tree, node_id))
+
+def _views(walk, node, prune):
+    tree = node.tree
+    for node_id in walk(tree, node.id, _prune_ids(tree, prune)):
+        yield ETNode(tree, node_id)
+
+def children(node):
+    return [ETNode(node.tree, child_id) for child_id in child_ids(node.tree, node.id)]
+
+def siblings(node):
+    return [ETNode(node.tree, node_id) for node_id in sibling_ids(node.tree, node.id)]
+
+def preorder(node, prune = None):
+    return _views(preorder_ids, node, prune)
+
+def postorder(node, prune = None):
+    return _views(postorder_ids, node, prune)
+
+def breadth_first(node, prune = None):
+    return _views(breadth_first_ids, node, prune)
+
+def levels(node, prune = None):
+    tree = node.tree
+    for level in level_ids(tree, node.id, _prune_ids(tree, prune)):
+        yield [ETNode(tree, node_id) for node_id in level]
@@ -0,0 +1,87 @@
+from etnode import ETNode, NONE
+from traversal import child_ids, postorder_ids
+from array import array
+import re
+
+# default reprs differ only by address between otherwise identical calls
+ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+def shown_values(tree, node_id):
+    """ The arguments, modified arguments and result of a call as the user is shown them,
+    None if they cannot be printed """
+    params, m_params = tree.params[node_id], tree.m_params[node_id]
+    try:
+        return ADDRESS.sub("", repr((params, params if m_params is None else m_params, tree.results[node_id])))
+    except Exception:
+        return None
+
+class TreeCompressor:
+    """ Groups the calls of an ExecutionTree that would be asked the same question.
+
+    Two subtrees are equivalent if their roots called the same function with the same
+    parameters, got the same result and their children are equivalent in order, so the
+    oracle answers once per class and the answer is copied to every member. Members keep
+    their place in the tree, pruning one of them must not hide another that is buggy.
+    A call that a function makes to itself can also be folded into its caller, its children
+    becoming the caller's: the bug then lies in that function either way. """
+    def __init__(self, exec_tree):
+        self.exec_tree = exec_tree
+        # representative (the first member in preorder) of the class of each node
+        self.classes = array("q", range(len(exec_tree.parents)))
+        self.members = {}
+        self.answers = {}
+        self.collapsed = 0
+        self.shared = 0
+        self.auto_answered = 0
+
+    def collapse_recursion(self):
+        """ Splices every direct recursive call into its caller, returns the number of calls removed """
+        tree = self.exec_tree
+        sources = tree.sources
+        def recursive(node_id):
+            # same code object as the caller it is spliced into
+            return sources[node_id] is sources[tree.parents[node_id]]
+        self.collapsed += tree.splice_all(recursive)
+        return self.collapsed
+
+    def key(self, node_id):
+        tree = self.exec_tree
+        values = shown_values(tree, node_id)
+        if values is None:
+            return None
+        children = tuple(self.classes[child_id] for child_id in child_ids(tree, node_id))
+        return (id(tree.sources[node_id]), tree.name_ids[node_id], tree.sigs[node_id], values, children)
+
+    def share_subtrees(self):
+        """ Puts identical subtrees in one class and lets them share their captured values,
+        returns the number of nodes that are no longer asked about on their own """
+        tree = self.exec_tree
+        representatives = {}
+        for root_id in tree.root_ids():
+            for node_id in postorder_ids(tree, root_id):
+                key = self.key(node_id)
+                if key is None:
+                    continue
+                rep_id = representatives.setdefault(key, node_id)
+                if rep_id == node_id:
+                    continue
+                self.classes[node_id] = rep_id
+                self.members.setdefault(rep_id, [rep_id]).append(node_id)
+                for values in (tree.sigs, tree.params, tree.m_params, tree.results):
+                    values[node_id] = values[rep_id]
+                self.shared += 1
+        return self.shared
+
+    def lookup(self, node):
+        """ The answer already given for the class of node, None if it was never asked """
+        answer = self.answers.get(self.classes[node.id])
+        if answer is not None:
+            self.auto_answered += 1
+        return answer
+
+    def record(self, node, answer):
+        rep_id = self.classes[node.id]
+        self.answers[rep_id] = answer
+        state = ETNode.State.VALID if answer == "Yes" else ETNode.State.INVALID
+        for member_id in self.members.get(rep_id, ()):
+            self.exec_tree.states[member_id] = state.value
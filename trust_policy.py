@@ -0,0 +1,62 @@
+from scope_filter import ScopeFilter
+from fnmatch import fnmatch
+import sysconfig
+import os
+
+def trusted(func):
+    """ Marks a function as trusted, the default "@trusted" rule finds it in the source """
+    return func
+
+def library_globs():
+    # the standard library, installed packages and frozen modules
+    paths = {sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")}
+    return [os.path.join(os.path.abspath(path), "*") for path in paths] + ["<frozen *>"]
+
+class TrustPolicy:
+    """ Decides at trace time which calls the user cannot have broken, they are never asked about.
+
+    A rule is a path glob (it contains a path separator or ends with .py), a decorator name
+    ("@lru_cache", "@functools.*"), "stdlib" for the standard library and installed packages,
+    or a glob matched against the module name and the module-qualified function name
+    ("json", "json.*", "parser.Parser.*"). """
+    def __init__(self, rules = ()):
+        self.files = []
+        # the marker itself when PyDD's own modules are traced
+        self.names = ["trust_policy.trusted"]
+        self.decorators = ["trusted"]
+        for rule in rules:
+            if rule == "stdlib":
+                self.files.extend(library_globs())
+            elif rule.startswith("@"):
+                self.decorators.append(rule[1:])
+            elif os.sep in rule or rule.endswith(".py"):
+                self.files.append(ScopeFilter.normalise(rule))
+            else:
+                self.names.append(rule)
+        self.cache = {}
+
+    def decorated(self, code_info):
+        # decorators are the lines above the def, its first line included in the source
+        for lineno in sorted(code_info.source):
+            line = code_info.source[lineno].strip()
+            if not line.startswith("@"):
+                return False
+            name = line[1:].split("(")[0].strip()
+            if any(fnmatch(name, pattern) or fnmatch(name.rsplit(".", 1)[-1], pattern) for pattern in self.decorators):
+                return True
+        return False
+
+    def trusts(self, frame, code_info):
+        co = frame.f_code
+        try:
+            return self.cache[co]
+        except KeyError:
+            pass
+        module_name = frame.f_globals.get("__name__", "")
+        qualname = f"{module_name}.{code_info.qualname}"
+        file_name = co.co_filename if co.co_filename.startswith("<") else os.path.abspath(co.co_filename)
+        result = any(fnmatch(file_name, pattern) for pattern in self.files) or \
+            any(fnmatch(module_name, pattern) or fnmatch(qualname, pattern) for pattern in self.names) or \
+                self.decorated(code_info)
+        self.cache[co] = result
+        return result
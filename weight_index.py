@@ -0,0 +1,101 @@
+from bisect import bisect_left, insort
+from array import array
+from itertools import chain
+from etnode import NONE
+from traversal import preorder_ids
+
+class WeightIndex:
+    """ Divide and query candidates of a suspect region, sorted by (weight, id).
+
+    The node whose weight is closest to a target is found by bisection; among equally close
+    nodes the one with the lowest id (the first in preorder) wins. A pruned subtree is the
+    contiguous id range the tracer gave it, so it is dropped with one slice of the dead flags
+    and, when it is large, one pass over the keys. """
+    def __init__(self, tree, root):
+        self.tree = tree
+        self.root_id = root.id
+        self.scale = len(tree.parents)
+        # 0 for the nodes that are still candidates, i.e. whose key is in keys
+        self.dead = bytearray(b"\x01") * self.scale
+        ids = list(preorder_ids(tree, root.id))
+        for node_id in ids:
+            self.dead[node_id] = 0
+        self.keys = array("q", sorted(self.key(tree.weights[node_id], node_id) for node_id in ids))
+
+    def key(self, weight, node_id):
+        return weight * self.scale + node_id
+
+    def __len__(self):
+        return len(self.keys)
+
+    def pop_closest(self, target):
+        """ Removes and returns the id of the node whose weight is closest to target """
+        keys, scale = self.keys, self.scale
+        if not keys:
+            return None
+        i = bisect_left(keys, target * scale)
+        best = None
+        if i > 0:
+            # the lowest id of that weight, not the highest
+            best = bisect_left(keys, keys[i - 1] // scale * scale)
+        if i < len(keys):
+            above = keys[i] // scale - target
+            below = target - keys[best] // scale if best is not None else None
+            if below is None or above < below or (above == below and keys[i] % scale < keys[best] % scale):
+                best = i
+        node_id = keys[best] % scale
+        del keys[best]
+        self.dead[node_id] = 1
+        return node_id
+
+    def remove(self, node_id):
+        del self.keys[bisect_left(self.keys, self.key(self.tree.weights[node_id], node_id))]
+        self.dead[node_id] = 1
+
+    # a prune that moves more keys than this rebuilds them in one pass
+    moves = 256
+
+    def prune(self, node, weight):
+        """ Drops the subtree of node and moves its ancestors to their reduced weight.
+
+        Up to moves keys are deleted and reinserted in place, each an O(n) shift of the array,
+        more are rebuilt in one pass: a prune costs O(n + d log d) for n candidates and d live
+        ancestors, not one shift per ancestor. """
+        start, end = node.id, self.tree.ends[node.id]
+        parents, weights, dead = self.tree.parents, self.tree.weights, self.dead
+        ancestors = []
+        node_id = parents[start]
+        while node_id != NONE:
+            if not dead[node_id]:
+                ancestors.append(node_id)
+            if node_id == self.root_id:
+                break
+            node_id = parents[node_id]
+        if dead.count(0, start, end) + len(ancestors) <= self.moves:
+            for node_id in range(start, end):
+                if not dead[node_id]:
+                    self.remove(node_id)
+            for node_id in ancestors:
+                del self.keys[bisect_left(self.keys, self.key(weights[node_id] + weight, node_id))]
+                insort(self.keys, self.key(weights[node_id], node_id))
+            return
+        dead[start:end] = b"\x01" * (end - start)
+        for node_id in ancestors:
+            dead[node_id] = 1
+        self.compact()
+        for node_id in ancestors:
+            dead[node_id] = 0
+        # ancestors come in ascending weight, so the sort merges two runs
+        self.keys = array("q", sorted(chain(self.keys, (self.key(weights[node_id], node_id) for node_id in ancestors))))
+
+    def restrict(self, node):
+        """ Makes the subtree of node the suspect region, everything outside its id range is dropped """
+        start, end = node.id, self.tree.ends[node.id]
+        self.root_id = node.id
+        self.dead[:start] = b"\x01" * start
+        self.dead[end:] = b"\x01" * (len(self.dead) - end)
+        self.compact()
+
+    def compact(self):
+        dead, scale = self.dead, self.scale
+        self.keys = array("q", [key for key in self.keys if not dead[key % scale]])